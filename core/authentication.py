@@ -0,0 +1,167 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils.functional import SimpleLazyObject
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from .models import TokenVersion
+
+
+# Access tokens carry is_staff and the customer id as signed claims, so a
+# request can be authenticated without loading the user. Tokens also carry
+# the user's token version, and revoking bumps the version in the database:
+# a token with an older one is refused. When the default cache is shared
+# by every process it fronts the version; a per-process cache can't see
+# another process's revocation, so then the version is read per request.
+
+VERSION_CLAIM = "ver"
+STAFF_CLAIM = "is_staff"
+CUSTOMER_CLAIM = "customer_id"
+TOKEN_VERSION_KEY = "core:user:{}:token_version"
+TOKEN_VERSION_TIMEOUT = getattr(settings, "CORE_TOKEN_VERSION_TIMEOUT", 300)
+# cached for a deleted user, whose tokens are all refused
+USER_GONE = -1
+
+
+def cache_is_shared():
+    return not isinstance(caches[DEFAULT_CACHE_ALIAS], (LocMemCache, DummyCache))
+
+
+def read_token_version(user_id):
+    """The version in the database, None when the user is gone."""
+    version = TokenVersion.objects.filter(user_id=OuterRef("pk")).values("version")
+    return (
+        get_user_model()
+        .objects.filter(pk=user_id)
+        .values_list(Coalesce(Subquery(version[:1]), 0), flat=True)
+        .first()
+    )
+
+
+def token_version(user_id):
+    """The user's current token version, None once the user is deleted."""
+    key = TOKEN_VERSION_KEY.format(user_id)
+    if not cache_is_shared():
+        return read_token_version(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = read_token_version(user_id)
+        # add, so a revocation published meanwhile isn't overwritten
+        cache.add(
+            key, USER_GONE if version is None else version, TOKEN_VERSION_TIMEOUT
+        )
+        return version
+    return None if version == USER_GONE else version
+
+
+def publish_token_version(user_id):
+    version = read_token_version(user_id)
+    cache.set(
+        TOKEN_VERSION_KEY.format(user_id),
+        USER_GONE if version is None else version,
+        TOKEN_VERSION_TIMEOUT,
+    )
+
+
+def revoke_tokens(user_id):
+    """Refuse every token issued for this user so far."""
+    with transaction.atomic():
+        TokenVersion.objects.get_or_create(user_id=user_id)
+        TokenVersion.objects.filter(user_id=user_id).update(version=F("version") + 1)
+    transaction.on_commit(lambda: publish_token_version(user_id))
+
+
+def forget_tokens(user_id):
+    """Refuse every token of a deleted user."""
+    TokenVersion.objects.filter(user_id=user_id).delete()
+    transaction.on_commit(lambda: publish_token_version(user_id))
+
+
+def add_claims(token, user):
+    token[STAFF_CLAIM] = user.is_staff
+    token[CUSTOMER_CLAIM] = user.customer_ref.id
+    token[VERSION_CLAIM] = token_version(user.pk)
+    return token
+
+
+def check_not_revoked(token):
+    user_id = token.get(api_settings.USER_ID_CLAIM)
+    if user_id is None:
+        return
+    version = token_version(user_id)
+    if version is None or token.get(VERSION_CLAIM, 0) < version:
+        raise InvalidToken("Token has been revoked")
+
+
+def load_user(user_id):
+    try:
+        return get_user_model().objects.get(**{api_settings.USER_ID_FIELD: user_id})
+    except get_user_model().DoesNotExist:
+        raise AuthenticationFailed("User not found", code="user_not_found")
+
+
+class ClaimsUser(SimpleLazyObject):
+    """
+    Stands in for the User a token belongs to. id, is_staff and the customer
+    come from the token; touching anything else loads the real row once and
+    proxies to it, like request.user under the session middleware.
+    """
+
+    def __init__(self, token):
+        user_id = token[api_settings.USER_ID_CLAIM]
+        super().__init__(lambda: load_user(user_id))
+        self.__dict__["token"] = token
+
+    @property
+    def id(self):
+        # simplejwt writes the id claim as a string
+        field = get_user_model()._meta.get_field(api_settings.USER_ID_FIELD)
+        return field.to_python(self.token[api_settings.USER_ID_CLAIM])
+
+    pk = id
+
+    @property
+    def is_staff(self):
+        return self.token[STAFF_CLAIM]
+
+    @property
+    def customer_id(self):
+        return self.token[CUSTOMER_CLAIM]
+
+    @property
+    def customer_ref(self):
+        from store.customers import get_customer_ref
+
+        return get_customer_ref(self.id)
+
+    # tokens are only minted for active users and revoked on deactivation
+    is_active = True
+    is_authenticated = True
+    is_anonymous = False
+
+    def __bool__(self):
+        return True
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication without the per-request user query. Tokens minted
+    before the claims existed still take the regular path.
+    """
+
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        check_not_revoked(token)
+        return token
+
+    def get_user(self, validated_token):
+        claims = (api_settings.USER_ID_CLAIM, STAFF_CLAIM, CUSTOMER_CLAIM)
+        if not all(claim in validated_token for claim in claims):
+            return super().get_user(validated_token)
+        return ClaimsUser(validated_token)
@@ -2,4 +2,28 @@ from django.db import models
 from django.contrib.auth.models import AbstractUser,AbstractBaseUser
 
 class User(AbstractUser):
-    email= models.EmailField(unique=True )
\ No newline at end of file
+    email= models.EmailField(unique=True )
+
+    @property
+    def customer_ref(self):
+        """(id, membership) of this user's store customer, usually from cache."""
+        from store.customers import get_customer_ref
+
+        return get_customer_ref(self.pk)
+
+    @property
+    def customer_id(self):
+        return self.customer_ref.id
+
+
+
+class TokenVersion(models.Model):
+    """
+    Tokens carry the version current when they were issued; bumping it
+    revokes them. Kept off the user row so saving a stale User can't move
+    it back, and keyed by a plain id instead of a FK so a revocation sent
+    while the user is being deleted has nothing to violate.
+    """
+
+    user_id = models.BigIntegerField(primary_key=True)
+    version = models.PositiveIntegerField(default=0)
@@ -3,6 +3,12 @@ from djoser.serializers import (
     UserCreateSerializer as BaseUserCreateSerializer,
 )
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import (
+    TokenObtainPairSerializer as BaseTokenObtainPairSerializer,
+    TokenRefreshSerializer as BaseTokenRefreshSerializer,
+)
+from rest_framework_simplejwt.tokens import RefreshToken
+from .authentication import add_claims, check_not_revoked
 
 
 class UserCreateSerializer(BaseUserCreateSerializer):
@@ -20,3 +26,16 @@ class UserSerializer(BaseUserSerializer):
             BaseUserSerializer.Meta.model
         )  # Ensure the model is correctly referenced
         fields = ["id", "username", "first_name", "last_name"]
+
+
+class TokenObtainPairSerializer(BaseTokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        # the access token copies these from the refresh token
+        return add_claims(super().get_token(user), user)
+
+
+class TokenRefreshSerializer(BaseTokenRefreshSerializer):
+    def validate(self, attrs):
+        check_not_revoked(RefreshToken(attrs["refresh"]))
+        return super().validate(attrs)
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from .authentication import forget_tokens, revoke_tokens
+
+
+# claims baked into tokens; changing any of them revokes the user's tokens
+TOKEN_FIELDS = ["is_staff", "is_active", "password"]
+
+
+@receiver(post_init, sender=settings.AUTH_USER_MODEL)
+def remember_token_fields(sender, instance, **kwargs):
+    # read from __dict__ so deferred loads don't trigger a query
+    instance._loaded_token_fields = [
+        instance.__dict__.get(field) for field in TOKEN_FIELDS
+    ]
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def revoke_tokens_on_change(sender, instance, created, **kwargs):
+    current = [getattr(instance, field) for field in TOKEN_FIELDS]
+    if not created and current != instance._loaded_token_fields:
+        revoke_tokens(instance.pk)
+    instance._loaded_token_fields = current
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def revoke_tokens_on_delete(sender, instance, **kwargs):
+    forget_tokens(instance.pk)
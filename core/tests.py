@@ -1,3 +1,112 @@
-from django.test import TestCase
+import tempfile
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from store.models import Customer
+from .authentication import ClaimsUser, revoke_tokens
 
-# Create your tests here.
+
+def shared_cache():
+    """A cache every process would see, standing in for memcached/redis."""
+    directory = tempfile.mkdtemp()
+    return override_settings(
+        CACHES={
+            "default": {
+                "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                "LOCATION": directory,
+            }
+        }
+    )
+
+
+class ClaimsAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username="shopper", email="shopper@example.com", password="secret-pw-1"
+        )
+        self.client = APIClient()
+
+    def obtain(self, password="secret-pw-1"):
+        response = self.client.post(
+            reverse("jwt-create"), {"username": "shopper", "password": password}
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def get_orders(self, access):
+        self.client.credentials(HTTP_AUTHORIZATION="JWT " + access)
+        return self.client.get(reverse("orders-list"))
+
+    def test_requests_are_authenticated_from_claims(self):
+        access = self.obtain()["access"]
+        token = AccessToken(access)
+        self.assertFalse(token["is_staff"])
+        self.assertEqual(
+            token["customer_id"], Customer.objects.get(user=self.user).pk
+        )
+
+        user_table = get_user_model()._meta.db_table
+        # a per-process cache can't be trusted with revocations, so the
+        # token version is read from the database on every request
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get_orders(access).status_code, 200)
+        self.assertEqual(len([q for q in queries if user_table in q["sql"]]), 1)
+
+        with shared_cache():
+            self.get_orders(access)
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.get_orders(access).status_code, 200)
+        self.assertFalse([q for q in queries if user_table in q["sql"]])
+
+    def test_claims_user_loads_the_row_only_when_needed(self):
+        user = ClaimsUser(AccessToken(self.obtain()["access"]))
+        with self.assertNumQueries(0):
+            self.assertEqual(user.pk, self.user.pk)
+            self.assertFalse(user.is_staff)
+            self.assertTrue(user.is_authenticated)
+        with self.assertNumQueries(1):
+            self.assertEqual(user.username, "shopper")
+            self.assertEqual(user.email, "shopper@example.com")
+
+    def test_password_change_revokes_access_and_refresh_tokens(self):
+        tokens = self.obtain()
+        self.assertEqual(self.get_orders(tokens["access"]).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.set_password("secret-pw-2")
+            self.user.save()
+
+        self.assertEqual(self.get_orders(tokens["access"]).status_code, 401)
+        response = self.client.post(
+            reverse("jwt-refresh"), {"refresh": tokens["refresh"]}
+        )
+        self.assertEqual(response.status_code, 401)
+        # logging straight back in works, however soon it happens
+        fresh = self.obtain("secret-pw-2")
+        self.assertEqual(self.get_orders(fresh["access"]).status_code, 200)
+
+    def test_revocations_accumulate_and_survive_cache_loss(self):
+        with shared_cache():
+            first = self.obtain()["access"]
+            with self.captureOnCommitCallbacks(execute=True):
+                revoke_tokens(self.user.pk)
+            second = self.obtain()["access"]
+            with self.captureOnCommitCallbacks(execute=True):
+                revoke_tokens(self.user.pk)
+            # an evicted or flushed entry is read back from the database
+            cache.clear()
+            self.assertEqual(self.get_orders(first).status_code, 401)
+            self.assertEqual(self.get_orders(second).status_code, 401)
+            self.assertEqual(self.get_orders(self.obtain()["access"]).status_code, 200)
+
+    def test_deleted_users_tokens_are_refused(self):
+        access = self.obtain()["access"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+        self.assertEqual(self.get_orders(access).status_code, 401)
@@ -57,6 +57,7 @@ INSTALLED_APPS = [
 # }
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "store.middleware.TelemetryMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "debug_toolbar.middleware.DebugToolbarMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -98,6 +99,17 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # a file, not shared-cache memory, so concurrent test writers wait
+        # on each other's locks instead of failing at once
+        "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
+    }
+}
+
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "ecommerce",
     }
 }
 
@@ -144,15 +156,21 @@ STATIC_URL = "static/"
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 REST_FRAMEWORK = {
     "COERCE_DECIMAL_TO_STRING": False,
+    "DEFAULT_RENDERER_CLASSES": (
+        "store.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
     # "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",  # Set the pagination class
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "core.authentication.ClaimsJWTAuthentication",
     ),
 }
 
 SIMPLE_JWT = {
     "AUTH_HEADER_TYPES": ("JWT"),
     "ACCESS_TOKEN_LIFETIME": timedelta(days=1),
+    "TOKEN_OBTAIN_SERIALIZER": "core.serializers.TokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "core.serializers.TokenRefreshSerializer",
 }
 
 DJOSER = {
@@ -1,4 +1,3 @@
-from django.db.models import Count
 from django.contrib import admin
 from .models import (
     Customer,
@@ -24,6 +23,7 @@ class ProductAdmin(admin.ModelAdmin):
     list_per_page = 10
     list_filter = ["collection", "last_update"]
     list_select_related = ["collection"]
+    readonly_fields = ["reviews_count"]
 
     def collection_name(self, product):
         return product.collection.title
@@ -38,6 +38,7 @@ class ProductAdmin(admin.ModelAdmin):
 @admin.register(Collection)
 class CollectionAdmin(admin.ModelAdmin):
     search_fields = ["title"]
+    readonly_fields = ["products_count"]
 
     @admin.display(ordering="products_count")
     def products_count(self, collection):
@@ -49,10 +50,6 @@ class CollectionAdmin(admin.ModelAdmin):
         return format_html('<a  href="{}">{}</a>', url, collection.products_count)
 
 
-    def get_queryset(self, request):
-        return super().get_queryset(request).annotate(products_count=Count("products"))
-
-
 @admin.register(Customer)
 class CustomerAdmin(admin.ModelAdmin):
     list_display = ["user__first_name", "user__last_name", "membership"]
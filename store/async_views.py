@@ -0,0 +1,159 @@
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.http import Http404, JsonResponse
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from .carts import get_cart_store
+from .models import Collection, Product
+from .pagination import ReviewPagination
+from .pricing import PriceCalculator
+from .serializer import (
+    CartSerializer,
+    CollectionSerializer,
+    ProductSerializer,
+    ReviewSerializer,
+)
+from .views import ProductViewSet, ReviewViewSet
+
+
+# Async-native versions of the catalog and cart reads, served under async/.
+# They go through Django's async ORM instead of a DRF view in a worker
+# thread, so they skip DRF authentication and are read-only and public,
+# like their sync counterparts' GET. Lists are filtered and ordered the
+# same way and come in pages of ?page_size= rows (default 20) without a
+# COUNT(*).
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def json_response(data, status=200):
+    # DRF's encoder, so decimals and dates come out like the sync endpoints
+    return JsonResponse(data, status=status, safe=False, encoder=JSONEncoder)
+
+
+def read_only(view):
+    """GET only, with 404s as JSON the way DRF sends them."""
+
+    @require_GET
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            return await view(request, *args, **kwargs)
+        except Http404:
+            return json_response({"detail": "Not found."}, status=404)
+
+    return wrapper
+
+
+async def aget_or_404(queryset, **kwargs):
+    try:
+        return await queryset.aget(**kwargs)
+    except queryset.model.DoesNotExist:
+        raise Http404
+
+
+async def alist(queryset):
+    return [row async for row in queryset]
+
+
+async def paginate(request, queryset):
+    try:
+        number = int(request.GET.get("page", 1))
+        size = min(int(request.GET.get("page_size", PAGE_SIZE)), MAX_PAGE_SIZE)
+    except ValueError:
+        raise Http404
+    if number < 1 or size < 1:
+        raise Http404
+    offset = (number - 1) * size
+    rows = await alist(queryset[offset : offset + size + 1])
+    url = request.build_absolute_uri()
+    previous = None
+    if number > 1:
+        previous = (
+            replace_query_param(url, "page", number - 1)
+            if number > 2
+            else remove_query_param(url, "page")
+        )
+    return {
+        "next": replace_query_param(url, "page", number + 1)
+        if len(rows) > size
+        else None,
+        "previous": previous,
+    }, rows[:size]
+
+
+def filter_list(viewset, request, **kwargs):
+    """
+    The sync viewset's list queryset, through its filter backends, so
+    ?search=, ?ordering= and the filters mean the same here. Sync, since
+    validating a filter value may look it up.
+    """
+    view = viewset(
+        request=Request(request), kwargs=kwargs, action="list", format_kwarg=None
+    )
+    return view.filter_queryset(view.get_queryset())
+
+
+@read_only
+async def product_list(request):
+    try:
+        queryset = await sync_to_async(filter_list)(ProductViewSet, request)
+    except ValidationError as error:
+        return json_response(error.detail, status=400)
+    (links, products) = await paginate(request, queryset)
+    try:
+        calculator = await PriceCalculator.aload(products, request.GET.get("region"))
+    except ValidationError as error:
+        return json_response(error.detail, status=400)
+    serializer = ProductSerializer(
+        products, many=True, context={"price_calculator": calculator}
+    )
+    return json_response({**links, "results": serializer.data})
+
+
+@read_only
+async def product_detail(request, pk):
+    product = await aget_or_404(Product.objects, pk=pk)
+    try:
+        calculator = await PriceCalculator.aload([product], request.GET.get("region"))
+    except ValidationError as error:
+        return json_response(error.detail, status=400)
+    serializer = ProductSerializer(product, context={"price_calculator": calculator})
+    return json_response(serializer.data)
+
+
+@read_only
+async def collection_list(request):
+    (links, collections) = await paginate(request, Collection.objects.order_by("id"))
+    serializer = CollectionSerializer(collections, many=True)
+    return json_response({**links, "results": serializer.data})
+
+
+@read_only
+async def collection_detail(request, pk):
+    collection = await aget_or_404(Collection.objects, pk=pk)
+    return json_response(CollectionSerializer(collection).data)
+
+
+@read_only
+async def review_list(request, product_pk):
+    queryset = await sync_to_async(filter_list)(
+        ReviewViewSet, request, product_pk=product_pk
+    )
+    # newest first, as the sync endpoint's cursor pages are
+    queryset = queryset.order_by(ReviewPagination.ordering)
+    (links, reviews) = await paginate(request, queryset)
+    serializer = ReviewSerializer(reviews, many=True)
+    return json_response({**links, "results": serializer.data})
+
+
+@read_only
+async def cart_detail(request, pk):
+    cart = await get_cart_store().aget(pk)
+    if cart is None:
+        raise Http404
+    return json_response(CartSerializer(cart).data)
@@ -0,0 +1,228 @@
+import os
+import statistics
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, connections
+from . import facets
+from .cache import bump_catalog
+from .catalog import resync_products_count, resync_reviews_count
+from .models import (
+    Collection,
+    Customer,
+    Order,
+    OrderItem,
+    Product,
+    Promotion,
+    Review,
+)
+from .search import get_search_backend
+
+
+@contextmanager
+def bench_database():
+    """
+    Run a benchmark against a throwaway copy of the schema instead of the
+    real database. SQLite gets a file (not :memory:) so worker threads can
+    share it.
+    """
+    alias_settings = settings.DATABASES[connection.alias]
+    saved_test = dict(alias_settings.get("TEST", {}))
+    saved_options = dict(alias_settings.get("OPTIONS", {}))
+    tmpdir = None
+    if connection.vendor == "sqlite":
+        tmpdir = tempfile.mkdtemp(prefix="store-bench-")
+        alias_settings.setdefault("TEST", {})["NAME"] = os.path.join(
+            tmpdir, "bench.sqlite3"
+        )
+        # IMMEDIATE avoids SQLite's read-to-write lock upgrade deadlocks
+        alias_settings.setdefault("OPTIONS", {}).update(
+            timeout=30, transaction_mode="IMMEDIATE"
+        )
+        connection.settings_dict["TEST"] = alias_settings["TEST"]
+        connection.settings_dict["OPTIONS"] = alias_settings["OPTIONS"]
+
+    old_name = connection.creation.create_test_db(
+        verbosity=0, autoclobber=True, serialize=False
+    )
+    try:
+        yield
+    finally:
+        connections.close_all()
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        alias_settings["TEST"] = saved_test
+        alias_settings["OPTIONS"] = saved_options
+        connection.settings_dict["TEST"] = saved_test
+        connection.settings_dict["OPTIONS"] = saved_options
+        if tmpdir:
+            os.rmdir(tmpdir)
+
+
+def run_concurrently(workers, iterations, task):
+    """
+    Call `task(worker, i)` `iterations` times from each of `workers` threads.
+    `task` returns True on success; exceptions count as errors.
+    """
+    latencies = []
+    outcomes = {"ok": 0, "failed": 0, "errors": 0}
+    lock = threading.Lock()
+
+    def work(worker):
+        try:
+            for i in range(iterations):
+                start = time.perf_counter()
+                try:
+                    outcome = "ok" if task(worker, i) else "failed"
+                except Exception:
+                    outcome = "errors"
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+                    outcomes[outcome] += 1
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=work, args=(w,)) for w in range(workers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, time.perf_counter() - start, **outcomes)
+
+
+def summarize(latencies, elapsed, **extra):
+    latencies = sorted(latencies)
+    if len(latencies) > 1:
+        cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+        (p50, p95, p99) = (cuts[49], cuts[94], cuts[98])
+    else:
+        p50 = p95 = p99 = latencies[0] if latencies else 0.0
+    return dict(
+        requests=len(latencies),
+        seconds=round(elapsed, 3),
+        rps=round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        p50_ms=round(p50 * 1000, 2),
+        p95_ms=round(p95 * 1000, 2),
+        p99_ms=round(p99 * 1000, 2),
+        **extra,
+    )
+
+
+def seed_store(
+    rng,
+    collections=20,
+    products=1000,
+    promotions=10,
+    reviews=2000,
+    customers=100,
+    orders=500,
+    batch_size=5000,
+):
+    """
+    Fill the (throwaway) database with a synthetic store. Everything goes in
+    with bulk_create, so the facet and search indexes and the collection and
+    review counts are rebuilt at the end instead of by signals. Returns the
+    product and user ids.
+    """
+    User = get_user_model()
+    collection_ids = [
+        c.pk
+        for c in Collection.objects.bulk_create(
+            [Collection(title="Collection {}".format(i)) for i in range(collections)]
+        )
+    ]
+    promotion_ids = [
+        p.pk
+        for p in Promotion.objects.bulk_create(
+            [
+                Promotion(description="Promotion {}".format(i), discount=0.1)
+                for i in range(promotions)
+            ]
+        )
+    ]
+
+    product_ids = []
+    for offset in range(0, products, batch_size):
+        product_ids += [
+            p.pk
+            for p in Product.objects.bulk_create(
+                [
+                    Product(
+                        title="Product {}".format(offset + i),
+                        slug="product-{}".format(offset + i),
+                        description="Synthetic product {}".format(offset + i),
+                        unit_price=rng.randint(100, 10000) / 100,
+                        inventory=1_000_000,
+                        collection_id=rng.choice(collection_ids),
+                    )
+                    for i in range(min(batch_size, products - offset))
+                ]
+            )
+        ]
+    if promotion_ids:
+        Link = Product.promotion.through
+        Link.objects.bulk_create(
+            [
+                Link(product_id=product_id, promotion_id=rng.choice(promotion_ids))
+                for product_id in product_ids[::4]
+            ],
+            batch_size=batch_size,
+        )
+    Review.objects.bulk_create(
+        [
+            Review(
+                product_id=rng.choice(product_ids),
+                name="Reviewer {}".format(i),
+                description="Synthetic review",
+            )
+            for i in range(reviews)
+        ],
+        batch_size=batch_size,
+    )
+
+    users = User.objects.bulk_create(
+        [
+            User(
+                username="shopper{}".format(i),
+                email="shopper{}@example.com".format(i),
+            )
+            for i in range(customers)
+        ],
+        batch_size=batch_size,
+    )
+    customer_ids = [
+        c.pk
+        for c in Customer.objects.bulk_create(
+            [Customer(user_id=user.pk) for user in users], batch_size=batch_size
+        )
+    ]
+    if customer_ids:
+        placed = Order.objects.bulk_create(
+            [Order(customer_id=rng.choice(customer_ids)) for _ in range(orders)],
+            batch_size=batch_size,
+        )
+        items = []
+        for order in placed:
+            for product_id in rng.sample(product_ids, min(3, len(product_ids))):
+                items.append(
+                    OrderItem(
+                        order_id=order.pk,
+                        product_id=product_id,
+                        quantity=rng.randint(1, 3),
+                        unit_price=10,
+                    )
+                )
+        OrderItem.objects.bulk_create(items, batch_size=batch_size)
+
+    facets.rebuild()
+    resync_products_count()
+    resync_reviews_count()
+    backend = get_search_backend()
+    if backend is not None:
+        backend.rebuild(Product.objects.all(), batch_size)
+    bump_catalog()
+    return product_ids, [user.pk for user in users]
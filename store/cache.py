@@ -0,0 +1,160 @@
+import hashlib
+import time
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+
+CATALOG_VERSION_KEY = "store:catalog:version"
+COLLECTION_VERSION_KEY = "store:collection:{}:version"
+REVIEWS_VERSION_KEY = "store:product:{}:reviews:version"
+
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, timeout=None)
+        version = cache.get(key, 1)
+    return version
+
+
+def bump_version(key):
+    # incr is atomic on memcached/redis; a missing key just starts a new series
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 2, timeout=None)
+    cache.set(key + ":modified", int(time.time()), timeout=None)
+
+
+def get_modified(key):
+    """When the version at key last changed; now, if that isn't known."""
+    modified = cache.get(key + ":modified")
+    if modified is None:
+        # erring late only costs a full response, never a stale 304
+        cache.add(key + ":modified", int(time.time()), timeout=None)
+        modified = cache.get(key + ":modified", int(time.time()))
+    return modified
+
+
+def bump_versions(keys):
+    """
+    Bump keys once the current transaction commits (at once outside one).
+    Bumped earlier, a read in between would cache the still-committed old
+    rows under the new version, where no later bump would replace them.
+    """
+    keys = list(keys)
+
+    def bump():
+        for key in keys:
+            bump_version(key)
+
+    transaction.on_commit(bump)
+
+
+def bump_catalog(collection_ids=()):
+    bump_versions(
+        [CATALOG_VERSION_KEY]
+        + [
+            COLLECTION_VERSION_KEY.format(collection_id)
+            for collection_id in set(collection_ids)
+            if collection_id is not None
+        ]
+    )
+
+
+def bump_reviews(product_id):
+    bump_versions([REVIEWS_VERSION_KEY.format(product_id)])
+
+
+class VersionedResponseMixin:
+    """
+    Names the cache version a list or retrieve response depends on: the
+    catalog version, or the collection version when the list is filtered by
+    collection.
+    """
+
+    cache_prefix = None
+
+    def get_version_key(self):
+        collection_id = self.request.query_params.get("collection_id")
+        if self.action == "list" and collection_id:
+            return COLLECTION_VERSION_KEY.format(collection_id)
+        return CATALOG_VERSION_KEY
+
+    def get_cache_version(self):
+        key = self.get_version_key()
+        return "{}.{}".format(key, get_version(key))
+
+    def get_cache_key(self):
+        params = sorted(self.request.query_params.lists())
+        digest = hashlib.md5(
+            repr((self.request.get_host(), params)).encode()
+        ).hexdigest()
+        return "store:{}:{}:{}:{}:{}".format(
+            self.cache_prefix or self.basename,
+            self.action,
+            self.kwargs.get(self.lookup_url_kwarg or self.lookup_field, ""),
+            self.get_cache_version(),
+            digest,
+        )
+
+
+class CachedResponseMixin(VersionedResponseMixin):
+    """
+    Read-through cache for the list and retrieve actions.
+
+    Keys embed the version from get_version_key(), so a bump makes every old
+    entry unreachable.
+    """
+
+    cache_timeout = 60 * 60
+
+    def cached_response(self, action, request, *args, **kwargs):
+        key = self.get_cache_key()
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = action(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, self.cache_timeout)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+
+class ConditionalResponseMixin(VersionedResponseMixin):
+    """
+    ETag and Last-Modified for the list and retrieve actions, taken from the
+    same versions the response cache uses. A matching If-None-Match or
+    If-Modified-Since gets a 304 without touching the database.
+    """
+
+    def get_etag(self):
+        key = "{}:{}".format(self.get_cache_key(), self.request.accepted_media_type)
+        return quote_etag(hashlib.md5(key.encode()).hexdigest())
+
+    def conditional_response(self, action, request, *args, **kwargs):
+        etag = self.get_etag()
+        last_modified = get_modified(self.get_version_key())
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = action(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response["ETag"] = etag
+            response["Last-Modified"] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(super().retrieve, request, *args, **kwargs)
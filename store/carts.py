@@ -0,0 +1,632 @@
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+from functools import lru_cache
+from uuid import uuid4
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import (
+    DecimalField,
+    ExpressionWrapper,
+    F,
+    IntegerField,
+    OuterRef,
+    Prefetch,
+    Subquery,
+    Sum,
+    Value,
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from . import inventory
+from .models import Cart, CartItem, Product
+
+
+CART_TTL = getattr(settings, "STORE_CART_TTL", 7 * 24 * 60 * 60)
+CLAIM_TIMEOUT = 30
+
+
+def adjust_cart_totals(cart_id, product_id, quantity):
+    """
+    Move a cart's stored subtotal and item count by `quantity` units of a
+    product (negative to remove) in a single UPDATE.
+    """
+    if not quantity:
+        return
+    unit_price = Subquery(
+        Product.objects.filter(pk=product_id).values("unit_price")[:1],
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+    Cart.objects.filter(pk=cart_id).update(
+        subtotal=ExpressionWrapper(
+            F("subtotal") + unit_price * Value(quantity),
+            output_field=Cart._meta.get_field("subtotal"),
+        ),
+        item_count=F("item_count") + quantity,
+        updated_at=timezone.now(),
+    )
+
+
+def reconcile_cart_totals(carts=None, batch_size=1000):
+    """
+    Recompute stored totals from the items, `batch_size` carts per UPDATE.
+    Returns the number of carts processed.
+    """
+    carts = Cart.objects.all() if carts is None else carts
+    items = CartItem.objects.filter(cart=OuterRef("pk")).values("cart")
+    subtotal = items.annotate(
+        total=Sum(
+            F("quantity") * F("product__unit_price"),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        )
+    ).values("total")
+    item_count = items.annotate(total=Sum("quantity")).values("total")
+
+    processed = 0
+    last_pk = None
+    while True:
+        batch = carts.order_by("pk")
+        if last_pk is not None:
+            batch = batch.filter(pk__gt=last_pk)
+        pks = list(batch.values_list("pk", flat=True)[:batch_size])
+        if not pks:
+            return processed
+        Cart.objects.filter(pk__in=pks).update(
+            subtotal=Coalesce(
+                Subquery(subtotal, output_field=DecimalField()),
+                Value(Decimal("0.00")),
+                output_field=Cart._meta.get_field("subtotal"),
+            ),
+            item_count=Coalesce(
+                Subquery(item_count, output_field=IntegerField()),
+                Value(0),
+                output_field=IntegerField(),
+            ),
+        )
+        processed += len(pks)
+        last_pk = pks[-1]
+
+
+def upsert_cart_item(cart_id, product_id, quantity):
+    """
+    Add `quantity` of a product to a cart in one statement.
+
+    The SELECT only yields a row when both the cart and the product exist, and
+    ON CONFLICT turns a concurrent second add into an in-place increment, so
+    no read-modify-write happens in Python. Returns (id, quantity) or None.
+    """
+    qn = connection.ops.quote_name
+    sql = (
+        "INSERT INTO {item} ({cart_col}, {product_col}, {quantity}) "
+        "SELECT {cart}.{cart_pk}, {product}.{product_pk}, %s "
+        "FROM {cart}, {product} "
+        "WHERE {cart}.{cart_pk} = %s AND {product}.{product_pk} = %s "
+        "ON CONFLICT ({cart_col}, {product_col}) "
+        "DO UPDATE SET {quantity} = {item}.{quantity} + EXCLUDED.{quantity} "
+        "RETURNING {item_pk}, {quantity}"
+    ).format(
+        item=qn(CartItem._meta.db_table),
+        item_pk=qn(CartItem._meta.pk.column),
+        cart_col=qn(CartItem._meta.get_field("cart").column),
+        product_col=qn(CartItem._meta.get_field("product").column),
+        quantity=qn(CartItem._meta.get_field("quantity").column),
+        cart=qn(Cart._meta.db_table),
+        cart_pk=qn(Cart._meta.pk.column),
+        product=qn(Product._meta.db_table),
+        product_pk=qn(Product._meta.pk.column),
+    )
+    params = [
+        quantity,
+        Cart._meta.pk.get_db_prep_value(cart_id, connection),
+        product_id,
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchone()
+
+
+class CartNotFound(Exception):
+    pass
+
+
+class UnknownProduct(Exception):
+    pass
+
+
+class CartBusy(Exception):
+    pass
+
+
+class CartContents:
+    """A cart read from any store, in the shape CartSerializer expects."""
+
+    def __init__(self, id, items, subtotal=None, item_count=None):
+        self.id = id
+        self.items = items
+        if subtotal is None:
+            subtotal = sum(
+                (item.quantity * item.product.unit_price for item in items),
+                Decimal("0.00"),
+            )
+        self.subtotal = subtotal
+        self.item_count = (
+            sum(item.quantity for item in items) if item_count is None else item_count
+        )
+
+
+class ORMCartStore:
+    """
+    Carts as Cart/CartItem rows in the main database, with stored totals
+    (see adjust_cart_totals). Item ids are CartItem primary keys.
+    """
+
+    def items_queryset(self, cart_id):
+        return CartItem.objects.filter(cart_id=cart_id).select_related("product")
+
+    def create(self):
+        return Cart.objects.create().pk
+
+    def exists(self, cart_id):
+        return Cart.objects.filter(pk=cart_id).exists()
+
+    def get(self, cart_id):
+        return (
+            Cart.objects.prefetch_related(
+                Prefetch("items", queryset=CartItem.objects.select_related("product"))
+            )
+            .filter(pk=cart_id)
+            .first()
+        )
+
+    async def aget(self, cart_id):
+        # one connection runs one query at a time, so these go in turn
+        cart = await Cart.objects.filter(pk=cart_id).afirst()
+        if cart is None:
+            return None
+        items = [item async for item in self.items_queryset(cart_id)]
+        return CartContents(cart.pk, items, cart.subtotal, cart.item_count)
+
+    def items(self, cart_id):
+        return list(self.items_queryset(cart_id))
+
+    def get_item(self, cart_id, item_id):
+        return self.items_queryset(cart_id).filter(pk=item_id).first()
+
+    def quantities(self, cart_id):
+        quantities = dict(
+            CartItem.objects.filter(cart_id=cart_id).values_list(
+                "product_id", "quantity"
+            )
+        )
+        if not quantities and not self.exists(cart_id):
+            return None
+        return quantities
+
+    def add(self, cart_id, product_id, quantity):
+        with transaction.atomic():
+            row = upsert_cart_item(cart_id, product_id, quantity)
+            if row is not None:
+                adjust_cart_totals(cart_id, product_id, quantity)
+        if row is None:
+            if not self.exists(cart_id):
+                raise CartNotFound(cart_id)
+            raise UnknownProduct(product_id)
+        (item_id, quantity) = row
+        return CartItem(
+            id=item_id, cart_id=cart_id, product_id=product_id, quantity=quantity
+        )
+
+    def update(self, cart_id, item_id, quantity):
+        with transaction.atomic():
+            item = (
+                CartItem.objects.select_for_update()
+                .filter(cart_id=cart_id, pk=item_id)
+                .first()
+            )
+            if item is None:
+                return None
+            old_quantity = item.quantity
+            item.quantity = quantity
+            item.save(update_fields=["quantity"])
+            adjust_cart_totals(cart_id, item.product_id, quantity - old_quantity)
+        return item
+
+    def remove(self, cart_id, item_id):
+        with transaction.atomic():
+            item = CartItem.objects.filter(cart_id=cart_id, pk=item_id).first()
+            if item is None:
+                return False
+            item.delete()
+            adjust_cart_totals(cart_id, item.product_id, -item.quantity)
+        return True
+
+    def delete(self, cart_id):
+        # the pre_delete signal gives back any reserved stock
+        (deleted, _) = Cart.objects.filter(pk=cart_id).delete()
+        return deleted > 0
+
+    def purge(self, idle_since, batch_size=1000):
+        """
+        Delete carts untouched since `idle_since`, `batch_size` per
+        transaction, yielding (carts, items, lock_wait_seconds) per batch.
+        """
+        while True:
+            with transaction.atomic():
+                start = time.perf_counter()
+                pks = list(
+                    Cart.objects.select_for_update(skip_locked=True)
+                    .filter(updated_at__lt=idle_since)
+                    .order_by("updated_at")
+                    .values_list("pk", flat=True)[:batch_size]
+                )
+                lock_wait = time.perf_counter() - start
+                if not pks:
+                    return
+                # one pass for the whole batch; the per-cart pre_delete
+                # signal then finds nothing left to release
+                inventory.release_carts(pks)
+                (_, deleted) = Cart.objects.filter(pk__in=pks).delete()
+            yield (
+                deleted.get(Cart._meta.label, 0),
+                deleted.get(CartItem._meta.label, 0),
+                lock_wait,
+            )
+
+    @contextmanager
+    def checkout(self, cart_id):
+        """
+        Yield the cart's {product_id: quantity} (None when there is no cart)
+        and delete the cart if the block succeeds. Must run in a transaction.
+        """
+        if not Cart.objects.select_for_update().filter(pk=cart_id).exists():
+            yield None
+            return
+        yield dict(
+            CartItem.objects.filter(cart_id=cart_id).values_list(
+                "product_id", "quantity"
+            )
+        )
+        Cart.objects.filter(pk=cart_id).delete()
+
+
+class HashCartStore:
+    """
+    Carts kept outside the main database as one {product_id: quantity} hash
+    per cart that expires CART_TTL seconds after its last write. Item ids
+    are product ids. Subclasses provide the storage primitives.
+    """
+
+    ttl = CART_TTL
+
+    def create(self):
+        cart_id = uuid4()
+        self.store(cart_id, {})
+        return cart_id
+
+    def exists(self, cart_id):
+        return self.load(cart_id) is not None
+
+    def get(self, cart_id):
+        quantities = self.load(cart_id)
+        if quantities is None:
+            return None
+        return CartContents(cart_id, self.build_items(cart_id, quantities))
+
+    async def aget(self, cart_id):
+        return await sync_to_async(self.get)(cart_id)
+
+    def build_items(self, cart_id, quantities):
+        products = Product.objects.only("id", "title", "unit_price").in_bulk(
+            list(quantities)
+        )
+        # a deleted product drops out, as its CartItem rows would cascade
+        return [
+            CartItem(
+                id=product_id,
+                cart_id=cart_id,
+                product=products[product_id],
+                quantity=quantity,
+            )
+            for product_id, quantity in quantities.items()
+            if product_id in products
+        ]
+
+    def items(self, cart_id):
+        return self.build_items(cart_id, self.load(cart_id) or {})
+
+    def get_item(self, cart_id, item_id):
+        quantity = (self.load(cart_id) or {}).get(int(item_id))
+        if quantity is None:
+            return None
+        items = self.build_items(cart_id, {int(item_id): quantity})
+        return items[0] if items else None
+
+    def quantities(self, cart_id):
+        return self.load(cart_id)
+
+    def add(self, cart_id, product_id, quantity):
+        if not Product.objects.filter(pk=product_id).exists():
+            if not self.exists(cart_id):
+                raise CartNotFound(cart_id)
+            raise UnknownProduct(product_id)
+        quantity = self.increment(cart_id, product_id, quantity)
+        if quantity is None:
+            raise CartNotFound(cart_id)
+        return CartItem(
+            id=product_id, cart_id=cart_id, product_id=product_id, quantity=quantity
+        )
+
+    def update(self, cart_id, item_id, quantity):
+        if not self.assign(cart_id, int(item_id), quantity):
+            return None
+        return self.get_item(cart_id, item_id)
+
+    def delete(self, cart_id):
+        deleted = self.discard(cart_id)
+        inventory.release_cart(cart_id)
+        return deleted
+
+    def purge(self, idle_since, batch_size=1000):
+        return iter(())
+
+    @contextmanager
+    def checkout(self, cart_id):
+        quantities = self.claim(cart_id)
+        if quantities is None:
+            yield None
+            return
+        try:
+            yield quantities
+        except BaseException:
+            self.unclaim(cart_id)
+            raise
+        # the cart lives outside the order's transaction: only drop it once
+        # the order is committed
+        transaction.on_commit(lambda: self.discard(cart_id))
+
+
+class CacheCartStore(HashCartStore):
+    """
+    One cache entry per cart. Writes are read-modify-write under a short
+    cache.add() lock; checkout holds the same lock until the order commits.
+    """
+
+    def key(self, cart_id):
+        return "cart:{}".format(cart_id)
+
+    def load(self, cart_id):
+        return cache.get(self.key(cart_id))
+
+    def store(self, cart_id, quantities):
+        cache.set(self.key(cart_id), quantities, self.ttl)
+
+    @contextmanager
+    def locked(self, cart_id, wait=2.0):
+        lock = self.key(cart_id) + ":lock"
+        deadline = time.monotonic() + wait
+        while not cache.add(lock, 1, CLAIM_TIMEOUT):
+            if time.monotonic() > deadline:
+                raise CartBusy(cart_id)
+            time.sleep(0.005)
+        try:
+            yield
+        finally:
+            cache.delete(lock)
+
+    def increment(self, cart_id, product_id, quantity):
+        with self.locked(cart_id):
+            quantities = self.load(cart_id)
+            if quantities is None:
+                return None
+            quantities[product_id] = quantities.get(product_id, 0) + quantity
+            self.store(cart_id, quantities)
+            return quantities[product_id]
+
+    def assign(self, cart_id, product_id, quantity):
+        with self.locked(cart_id):
+            quantities = self.load(cart_id)
+            if quantities is None or product_id not in quantities:
+                return False
+            quantities[product_id] = quantity
+            self.store(cart_id, quantities)
+            return True
+
+    def remove(self, cart_id, item_id):
+        with self.locked(cart_id):
+            quantities = self.load(cart_id)
+            if quantities is None or quantities.pop(int(item_id), None) is None:
+                return False
+            self.store(cart_id, quantities)
+            return True
+
+    def discard(self, cart_id):
+        existed = cache.get(self.key(cart_id)) is not None
+        cache.delete_many([self.key(cart_id), self.key(cart_id) + ":lock"])
+        return existed
+
+    def claim(self, cart_id):
+        lock = self.key(cart_id) + ":lock"
+        if not cache.add(lock, 1, CLAIM_TIMEOUT):
+            raise CartBusy(cart_id)
+        quantities = self.load(cart_id)
+        if quantities is None:
+            cache.delete(lock)
+        return quantities
+
+    def unclaim(self, cart_id):
+        cache.delete(self.key(cart_id) + ":lock")
+
+
+class SQLiteCartStore(HashCartStore):
+    """
+    A side SQLite file (STORE_CART_DATABASE) with one row per cart holding
+    its items as a JSON object. Every write is a single UPDATE using SQLite's
+    JSON functions, so there is no read-modify-write to race on.
+    """
+
+    def __init__(self, path=None):
+        self.path = str(
+            path
+            or getattr(settings, "STORE_CART_DATABASE", None)
+            or settings.BASE_DIR / "carts.sqlite3"
+        )
+        self.local = threading.local()
+
+    @property
+    def db(self):
+        db = getattr(self.local, "db", None)
+        if db is None:
+            db = self.local.db = sqlite3.connect(
+                self.path, timeout=30, isolation_level=None
+            )
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS cart ("
+                "id TEXT PRIMARY KEY, items TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, claimed_until REAL"
+                ") WITHOUT ROWID"
+            )
+            db.execute(
+                "CREATE INDEX IF NOT EXISTS cart_expires_at ON cart (expires_at)"
+            )
+        return db
+
+    def path_for(self, product_id):
+        return '$."{}"'.format(int(product_id))
+
+    def load(self, cart_id):
+        row = self.db.execute(
+            "SELECT items FROM cart WHERE id = ? AND expires_at > ?",
+            (str(cart_id), time.time()),
+        ).fetchone()
+        if row is None:
+            return None
+        return {int(k): v for k, v in json.loads(row[0]).items()}
+
+    def store(self, cart_id, quantities):
+        self.db.execute(
+            "INSERT OR REPLACE INTO cart (id, items, expires_at) VALUES (?, ?, ?)",
+            (str(cart_id), json.dumps(quantities), time.time() + self.ttl),
+        )
+
+    def write(self, cart_id, expression, params, where=""):
+        """
+        Apply an UPDATE to an unclaimed cart's items and return them, or None
+        when the cart or the item is missing. Raises CartBusy while checkout
+        holds the cart, whose changes it would otherwise discard unseen.
+        """
+        now = time.time()
+        row = self.db.execute(
+            "UPDATE cart SET items = {}, expires_at = ? "
+            "WHERE id = ? AND expires_at > ? "
+            "AND (claimed_until IS NULL OR claimed_until < ?) {} "
+            "RETURNING items".format(expression, where),
+            (*params, now + self.ttl, str(cart_id), now, now),
+        ).fetchone()
+        if row is None:
+            if self.claimed(cart_id, now):
+                raise CartBusy(cart_id)
+            return None
+        return json.loads(row[0])
+
+    def claimed(self, cart_id, now):
+        return (
+            self.db.execute(
+                "SELECT 1 FROM cart WHERE id = ? AND expires_at > ? "
+                "AND claimed_until >= ?",
+                (str(cart_id), now, now),
+            ).fetchone()
+            is not None
+        )
+
+    def increment(self, cart_id, product_id, quantity):
+        path = self.path_for(product_id)
+        items = self.write(
+            cart_id,
+            "json_set(items, ?, coalesce(json_extract(items, ?), 0) + ?)",
+            (path, path, quantity),
+        )
+        return None if items is None else items[str(product_id)]
+
+    def assign(self, cart_id, product_id, quantity):
+        path = self.path_for(product_id)
+        return (
+            self.write(
+                cart_id,
+                "json_set(items, ?, ?)",
+                (path, quantity),
+                "AND json_extract(items, '{}') IS NOT NULL".format(path),
+            )
+            is not None
+        )
+
+    def remove(self, cart_id, item_id):
+        path = self.path_for(item_id)
+        return (
+            self.write(
+                cart_id,
+                "json_remove(items, ?)",
+                (path,),
+                "AND json_extract(items, '{}') IS NOT NULL".format(path),
+            )
+            is not None
+        )
+
+    def discard(self, cart_id):
+        return (
+            self.db.execute("DELETE FROM cart WHERE id = ?", (str(cart_id),)).rowcount
+            > 0
+        )
+
+    def purge(self, idle_since, batch_size=1000):
+        # expires_at is last write + ttl
+        cutoff = idle_since.timestamp() + self.ttl
+        while True:
+            start = time.perf_counter()
+            rows = self.db.execute(
+                "DELETE FROM cart WHERE id IN ("
+                "SELECT id FROM cart WHERE expires_at < ? LIMIT ?"
+                ") RETURNING id, (SELECT count(*) FROM json_each(items))",
+                (cutoff, batch_size),
+            ).fetchall()
+            lock_wait = time.perf_counter() - start
+            if not rows:
+                return
+            inventory.release_carts([cart_id for (cart_id, _) in rows])
+            yield len(rows), sum(items for (_, items) in rows), lock_wait
+
+    def claim(self, cart_id):
+        now = time.time()
+        row = self.db.execute(
+            "UPDATE cart SET claimed_until = ? WHERE id = ? AND expires_at > ? "
+            "AND (claimed_until IS NULL OR claimed_until < ?) RETURNING items",
+            (now + CLAIM_TIMEOUT, str(cart_id), now, now),
+        ).fetchone()
+        if row is None:
+            if self.exists(cart_id):
+                raise CartBusy(cart_id)
+            return None
+        return {int(k): v for k, v in json.loads(row[0]).items()}
+
+    def unclaim(self, cart_id):
+        self.db.execute(
+            "UPDATE cart SET claimed_until = NULL WHERE id = ?", (str(cart_id),)
+        )
+
+
+@lru_cache
+def _load_cart_store(path):
+    return import_string(path)()
+
+
+def get_cart_store():
+    """The store named by STORE_CART_BACKEND, the ORM one by default."""
+    return _load_cart_store(
+        getattr(settings, "STORE_CART_BACKEND", "store.carts.ORMCartStore")
+    )
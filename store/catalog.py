@@ -0,0 +1,232 @@
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from . import facets
+from .cache import bump_catalog
+from .carts import reconcile_cart_totals
+from .models import Cart, Collection, Product, Review
+from .search import get_search_backend
+
+
+FIELDS = ["title", "slug", "description", "unit_price", "inventory", "collection"]
+UPDATE_FIELDS = ["title", "description", "unit_price", "inventory", "collection"]
+
+
+def adjust_products_count(collection_id, delta):
+    Collection.objects.filter(pk=collection_id).update(
+        products_count=F("products_count") + delta
+    )
+
+
+def resync_products_count(collection_ids=None):
+    """Recount Collection.products_count in one UPDATE, optionally for some ids."""
+    counts = (
+        Product.objects.filter(collection=OuterRef("pk"))
+        .order_by()
+        .values("collection")
+        .annotate(count=Count("id"))
+        .values("count")
+    )
+    collections = Collection.objects.all()
+    if collection_ids is not None:
+        collections = collections.filter(pk__in=collection_ids)
+    return collections.update(products_count=Coalesce(Subquery(counts), Value(0)))
+
+
+def adjust_reviews_count(product_id, delta):
+    Product.objects.filter(pk=product_id).update(
+        reviews_count=F("reviews_count") + delta
+    )
+
+
+def resync_reviews_count(product_ids=None):
+    """Recount Product.reviews_count in one UPDATE, optionally for some ids."""
+    counts = (
+        Review.objects.filter(product=OuterRef("pk"))
+        .order_by()
+        .values("product")
+        .annotate(count=Count("id"))
+        .values("count")
+    )
+    products = Product.objects.all()
+    if product_ids is not None:
+        products = products.filter(pk__in=product_ids)
+    return products.update(reviews_count=Coalesce(Subquery(counts), Value(0)))
+
+
+def read_rows(stream, fmt):
+    """
+    Yield (line_number, row) pairs without loading the whole file. A JSON
+    line that doesn't parse comes out as None, for clean_row to reject.
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_number, line in enumerate(stream, start=1):
+            if line.strip():
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    row = None
+                yield line_number, row
+
+
+def write_rows(stream, fmt, rows):
+    if fmt == "csv":
+        writer = csv.writer(stream)
+        writer.writerow(FIELDS)
+        writer.writerows(rows)
+    else:
+        for row in rows:
+            stream.write(json.dumps(dict(zip(FIELDS, row)), default=str))
+            stream.write("\n")
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def clean_row(row):
+    """Return (cleaned, None) or (None, error message) for one input row."""
+    if not isinstance(row, dict):
+        return None, "not a JSON object"
+    missing = [field for field in FIELDS if not str(row.get(field) or "").strip()]
+    if missing:
+        return None, "missing {}".format(", ".join(missing))
+    try:
+        unit_price = Decimal(str(row["unit_price"]))
+        inventory = int(row["inventory"])
+    except (InvalidOperation, ValueError):
+        return None, "unit_price must be a decimal and inventory an integer"
+    if unit_price < 0 or unit_price >= Decimal("1e8"):
+        return None, "unit_price out of range"
+    if inventory < 0:
+        return None, "inventory can't be negative"
+    return {
+        "title": str(row["title"]).strip()[:255],
+        "slug": str(row["slug"]).strip()[:50],
+        "description": str(row["description"]),
+        "unit_price": unit_price.quantize(Decimal("0.01")),
+        "inventory": inventory,
+        "collection": str(row["collection"]).strip()[:255],
+    }, None
+
+
+class ProductImporter:
+    """
+    Upsert products by slug, one chunk at a time: one collection lookup, one
+    slug lookup, then bulk_update/bulk_create per chunk. Bulk writes skip
+    model signals, so the search index, facets, collection counts, cart
+    totals and response cache are brought up to date here instead.
+    """
+
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.created = 0
+        self.updated = 0
+        self.errors = []
+        self.collection_ids = set()
+
+    def run(self, rows):
+        for chunk in chunked(rows, self.batch_size):
+            self.import_chunk(chunk)
+        facets.rebuild()
+        # bulk_update may have moved products out of collections not in the file
+        resync_products_count()
+        bump_catalog(self.collection_ids)
+
+    def import_chunk(self, chunk):
+        cleaned = {}
+        for line_number, row in chunk:
+            (product, error) = clean_row(row)
+            if error:
+                self.errors.append((line_number, error))
+            else:
+                # a slug repeated inside one chunk keeps its last row
+                cleaned[product["slug"]] = product
+        if not cleaned:
+            return
+
+        with transaction.atomic():
+            collections = self.resolve_collections(
+                {product["collection"] for product in cleaned.values()}
+            )
+            existing = {}
+            for pk, slug, collection_id in (
+                Product.objects.filter(slug__in=cleaned)
+                .order_by("-pk")
+                .values_list("pk", "slug", "collection_id")
+            ):
+                existing[slug] = pk
+                # a product moved elsewhere leaves its old collection's lists
+                self.collection_ids.add(collection_id)
+
+            to_update = []
+            to_create = []
+            for slug, product in cleaned.items():
+                instance = Product(
+                    pk=existing.get(slug),
+                    slug=slug,
+                    title=product["title"],
+                    description=product["description"],
+                    unit_price=product["unit_price"],
+                    inventory=product["inventory"],
+                    collection_id=collections[product["collection"]],
+                )
+                (to_update if instance.pk else to_create).append(instance)
+
+            if to_update:
+                Product.objects.bulk_update(to_update, UPDATE_FIELDS)
+                reconcile_cart_totals(
+                    Cart.objects.filter(
+                        items__product_id__in=[p.pk for p in to_update]
+                    ).distinct()
+                )
+            if to_create:
+                Product.objects.bulk_create(to_create)
+
+            backend = get_search_backend()
+            if backend is not None:
+                backend.index(
+                    (p.pk, p.title, p.description) for p in to_update + to_create
+                )
+
+        self.updated += len(to_update)
+        self.created += len(to_create)
+        self.collection_ids.update(collections.values())
+
+    def resolve_collections(self, titles):
+        collections = {}
+        for pk, title in (
+            Collection.objects.filter(title__in=titles)
+            .order_by("-pk")
+            .values_list("pk", "title")
+        ):
+            collections[title] = pk
+        missing = [Collection(title=title) for title in titles - collections.keys()]
+        for collection in Collection.objects.bulk_create(missing):
+            collections[collection.title] = collection.pk
+        return collections
+
+
+def export_rows(queryset, chunk_size=2000):
+    return (
+        queryset.order_by("pk")
+        .values_list(
+            "title",
+            "slug",
+            "description",
+            "unit_price",
+            "inventory",
+            "collection__title",
+        )
+        .iterator(chunk_size=chunk_size)
+    )
@@ -0,0 +1,116 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from .models import Customer
+
+
+# user id -> (customer id, membership), so authenticated requests don't look
+# the customer up every time. Each process keeps a small LRU in front of the
+# shared cache; its entries live LOCAL_TTL seconds, which bounds how long
+# another process can see a membership change or a deleted customer late.
+
+CUSTOMER_KEY = "store:user:{}:customer"
+CACHE_TIMEOUT = getattr(
+    settings,
+    "STORE_CUSTOMER_CACHE_TIMEOUT",
+    int(jwt_settings.ACCESS_TOKEN_LIFETIME.total_seconds()),
+)
+LOCAL_SIZE = getattr(settings, "STORE_CUSTOMER_LOCAL_SIZE", 4096)
+LOCAL_TTL = getattr(settings, "STORE_CUSTOMER_LOCAL_TTL", 60)
+
+CustomerRef = namedtuple("CustomerRef", ["id", "membership"])
+
+
+class LocalCache:
+    """A thread-safe LRU whose entries also expire after ttl seconds."""
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+local = LocalCache(LOCAL_SIZE, LOCAL_TTL)
+
+
+def remember(user_id, customer_id, membership):
+    ref = CustomerRef(customer_id, membership)
+    local.set(user_id, ref)
+    cache.set(CUSTOMER_KEY.format(user_id), tuple(ref), CACHE_TIMEOUT)
+    return ref
+
+
+def forget(user_id):
+    local.delete(user_id)
+    cache.delete(CUSTOMER_KEY.format(user_id))
+
+
+def ensure_customer(user_id):
+    """The user's Customer, created if it is missing, safe against races."""
+    try:
+        return Customer.objects.get(user_id=user_id)
+    except Customer.DoesNotExist:
+        pass
+    try:
+        with transaction.atomic():
+            return Customer.objects.create(user_id=user_id)
+    except IntegrityError:
+        # another request created it first
+        return Customer.objects.get(user_id=user_id)
+
+
+def load_customer(user_id):
+    """The full Customer row, refreshing the cached reference on the way."""
+    customer = ensure_customer(user_id)
+    remember(user_id, customer.pk, customer.membership)
+    return customer
+
+
+def get_customer_ref(user_id):
+    """CustomerRef for a user: local LRU, then the shared cache, then the DB."""
+    ref = local.get(user_id)
+    if ref is not None:
+        return ref
+    cached = cache.get(CUSTOMER_KEY.format(user_id))
+    if cached is not None:
+        ref = CustomerRef(*cached)
+        local.set(user_id, ref)
+        return ref
+    row = (
+        Customer.objects.filter(user_id=user_id).values_list("pk", "membership").first()
+    )
+    if row is None:
+        customer = ensure_customer(user_id)
+        row = (customer.pk, customer.membership)
+    return remember(user_id, *row)
@@ -0,0 +1,78 @@
+import csv
+import json
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
+from .models import OrderItem
+
+
+ORDER_COLUMNS = ["order_id", "placed_at", "customer_id", "payment_status"]
+ITEM_COLUMNS = ["item_id", "product_id", "product_title", "quantity", "unit_price"]
+
+
+class Echo:
+    # csv.writer only needs write(); returning the line lets us yield it
+    def write(self, value):
+        return value
+
+
+def iter_orders(queryset, chunk_size):
+    """
+    Orders with their items, prefetched one chunk at a time so memory stays
+    flat however many orders match.
+    """
+    items = OrderItem.objects.select_related("product").only(
+        "id", "order_id", "quantity", "unit_price", "product__id", "product__title"
+    )
+    return (
+        queryset.order_by("pk")
+        .only("id", "placed_at", "customer_id", "payment_status")
+        .prefetch_related(None)
+        .prefetch_related(Prefetch("items", queryset=items))
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+def order_row(order):
+    return [
+        order.pk,
+        order.placed_at.isoformat(),
+        order.customer_id,
+        order.payment_status,
+    ]
+
+
+def item_row(item):
+    return [item.pk, item.product_id, item.product.title, item.quantity, item.unit_price]
+
+
+def stream_csv(orders):
+    writer = csv.writer(Echo())
+    yield writer.writerow(ORDER_COLUMNS + ITEM_COLUMNS)
+    for order in orders:
+        items = order.items.all()
+        if not items:
+            yield writer.writerow(order_row(order) + [""] * len(ITEM_COLUMNS))
+        for item in items:
+            yield writer.writerow(order_row(order) + item_row(item))
+
+
+def stream_ndjson(orders):
+    for order in orders:
+        record = dict(zip(ORDER_COLUMNS, order_row(order)))
+        record["items"] = [
+            dict(zip(ITEM_COLUMNS, item_row(item))) for item in order.items.all()
+        ]
+        yield json.dumps(record, default=str) + "\n"
+
+
+def export_orders_response(queryset, output, chunk_size=500):
+    orders = iter_orders(queryset, chunk_size)
+    if output == "csv":
+        response = StreamingHttpResponse(stream_csv(orders), content_type="text/csv")
+        response["Content-Disposition"] = 'attachment; filename="orders.csv"'
+    else:
+        response = StreamingHttpResponse(
+            stream_ndjson(orders), content_type="application/x-ndjson"
+        )
+        response["Content-Disposition"] = 'attachment; filename="orders.ndjson"'
+    return response
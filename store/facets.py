@@ -0,0 +1,174 @@
+from collections import Counter
+from decimal import Decimal
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, CharField, Count, Q, Value, When
+from .models import Product, ProductFacet
+
+
+PRICE_BANDS = [
+    Decimal(str(edge))
+    for edge in getattr(settings, "STORE_PRICE_BANDS", [0, 10, 25, 50, 100])
+]
+IN_STOCK = "in_stock"
+OUT_OF_STOCK = "out_of_stock"
+
+
+def price_band(unit_price):
+    label = None
+    for low, high in zip(PRICE_BANDS, PRICE_BANDS[1:] + [None]):
+        if unit_price >= low:
+            label = "{}-{}".format(low, high) if high is not None else "{}+".format(low)
+    return label
+
+
+def stock_value(inventory):
+    return IN_STOCK if inventory > 0 else OUT_OF_STOCK
+
+
+def product_facets(collection_id, unit_price, inventory):
+    """The (facet, value) pairs a product counts towards, promotions aside."""
+    pairs = [
+        (ProductFacet.FACET_COLLECTION, str(collection_id)),
+        (ProductFacet.FACET_STOCK, stock_value(inventory)),
+    ]
+    band = price_band(unit_price)
+    if band is not None:
+        pairs.append((ProductFacet.FACET_PRICE, band))
+    return pairs
+
+
+def adjust(deltas):
+    """
+    Apply {(facet, value): delta} to the index with one upsert per pair, so
+    concurrent writers increment instead of overwriting each other.
+    """
+    rows = [(facet, value, delta) for (facet, value), delta in deltas.items() if delta]
+    if not rows:
+        return
+    qn = connection.ops.quote_name
+    sql = (
+        "INSERT INTO {table} ({facet}, {value}, {count}) VALUES (%s, %s, %s) "
+        "ON CONFLICT ({facet}, {value}) "
+        "DO UPDATE SET {count} = {table}.{count} + EXCLUDED.{count}"
+    ).format(
+        table=qn(ProductFacet._meta.db_table),
+        facet=qn("facet"),
+        value=qn("value"),
+        count=qn("count"),
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+def product_changed(old, new):
+    """
+    Move a product between facets. `old`/`new` are (collection_id,
+    unit_price, inventory) tuples, None for a created/deleted product.
+    """
+    deltas = Counter()
+    if old is not None:
+        for pair in product_facets(*old):
+            deltas[pair] -= 1
+    if new is not None:
+        for pair in product_facets(*new):
+            deltas[pair] += 1
+    adjust(deltas)
+
+
+def promotions_changed(promotion_ids, delta):
+    deltas = Counter()
+    for promotion_id in promotion_ids:
+        deltas[(ProductFacet.FACET_PROMOTION, str(promotion_id))] += delta
+    adjust(deltas)
+
+
+def promotion_deleted(promotion_id):
+    ProductFacet.objects.filter(
+        facet=ProductFacet.FACET_PROMOTION, value=str(promotion_id)
+    ).delete()
+
+
+def stock_moved(newly_out=0, back_in=0):
+    adjust(
+        {
+            (ProductFacet.FACET_STOCK, IN_STOCK): back_in - newly_out,
+            (ProductFacet.FACET_STOCK, OUT_OF_STOCK): newly_out - back_in,
+        }
+    )
+
+
+def count_facets(queryset):
+    """Facet counts computed straight from a (filtered) product queryset."""
+    queryset = queryset.order_by()
+    facets = {
+        ProductFacet.FACET_COLLECTION: {
+            str(collection_id): count
+            for collection_id, count in queryset.values_list("collection_id")
+            .annotate(count=Count("id"))
+            .values_list("collection_id", "count")
+        },
+        ProductFacet.FACET_PROMOTION: {
+            str(promotion_id): count
+            for promotion_id, count in queryset.filter(promotion__isnull=False)
+            .values_list("promotion")
+            .annotate(count=Count("id"))
+            .values_list("promotion", "count")
+        },
+    }
+
+    bands = []
+    for low, high in zip(PRICE_BANDS, PRICE_BANDS[1:] + [None]):
+        condition = Q(unit_price__gte=low)
+        if high is not None:
+            condition &= Q(unit_price__lt=high)
+        bands.append(When(condition, then=Value(price_band(low))))
+    facets[ProductFacet.FACET_PRICE] = {
+        band: count
+        for band, count in queryset.annotate(
+            band=Case(*bands, output_field=CharField())
+        )
+        .filter(band__isnull=False)
+        .values_list("band")
+        .annotate(count=Count("id"))
+        .values_list("band", "count")
+    }
+
+    stock = queryset.aggregate(
+        in_stock=Count("id", filter=Q(inventory__gt=0)),
+        out_of_stock=Count("id", filter=Q(inventory__lte=0)),
+    )
+    facets[ProductFacet.FACET_STOCK] = {
+        value: count for value, count in stock.items() if count
+    }
+    return facets
+
+
+def read_index():
+    facets = {
+        ProductFacet.FACET_COLLECTION: {},
+        ProductFacet.FACET_PRICE: {},
+        ProductFacet.FACET_PROMOTION: {},
+        ProductFacet.FACET_STOCK: {},
+    }
+    for facet, value, count in ProductFacet.objects.filter(count__gt=0).values_list(
+        "facet", "value", "count"
+    ):
+        facets.setdefault(facet, {})[value] = count
+    return facets
+
+
+def rebuild(facets=None):
+    """Recount the index from the product table, optionally only some facets."""
+    with transaction.atomic():
+        counts = count_facets(Product.objects.all())
+        if facets is not None:
+            counts = {facet: counts[facet] for facet in facets}
+        ProductFacet.objects.filter(facet__in=counts).delete()
+        ProductFacet.objects.bulk_create(
+            [
+                ProductFacet(facet=facet, value=value, count=count)
+                for facet, values in counts.items()
+                for value, count in values.items()
+            ]
+        )
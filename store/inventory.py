@@ -0,0 +1,284 @@
+import random
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Q, Sum, When
+from django.utils import timezone
+from .cache import bump_catalog
+from .models import Product, ProductFacet, StockReservation, StockShard
+from . import facets
+
+
+RESERVATION_TTL = timedelta(
+    seconds=getattr(settings, "STORE_RESERVATION_TTL", 15 * 60)
+)
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product_ids):
+        super().__init__("Not enough inventory for products {}".format(product_ids))
+        self.product_ids = product_ids
+
+
+def take_stock(quantities):
+    """
+    Take `quantities` ({product_id: quantity}) out of stock.
+
+    Plain products are decremented with one conditional UPDATE; striped (hot)
+    products are taken from one of their shards so concurrent buyers of the
+    same product mostly update different rows. Raises InsufficientStock, and
+    rolls the whole take back, when any product would oversell.
+    """
+    quantities = {pk: qty for pk, qty in quantities.items() if qty > 0}
+    if not quantities:
+        return
+    with transaction.atomic():
+        shards = _shards_by_product(quantities)
+        plain = {pk: qty for pk, qty in quantities.items() if pk not in shards}
+
+        if plain:
+            enough_stock = Q()
+            for product_id, quantity in plain.items():
+                enough_stock |= Q(pk=product_id, inventory__gte=quantity)
+            updated = Product.objects.filter(enough_stock).update(
+                inventory=Case(
+                    *[
+                        When(pk=product_id, then=F("inventory") - quantity)
+                        for product_id, quantity in plain.items()
+                    ],
+                    default=F("inventory"),
+                )
+            )
+            if updated != len(plain):
+                short = Product.objects.filter(pk__in=plain).exclude(enough_stock)
+                raise InsufficientStock(list(short.values_list("pk", flat=True)))
+            # every row taken had stock before, so zero now means sold out now
+            facets.stock_moved(
+                newly_out=Product.objects.filter(pk__in=plain, inventory=0).count()
+            )
+
+        for product_id, shard_ids in shards.items():
+            _take_from_shards(product_id, shard_ids, quantities[product_id])
+
+        _stock_changed(quantities)
+
+
+def return_stock(quantities):
+    quantities = {pk: qty for pk, qty in quantities.items() if qty > 0}
+    if not quantities:
+        return
+    shards = _shards_by_product(quantities)
+    plain = {pk: qty for pk, qty in quantities.items() if pk not in shards}
+
+    if plain:
+        Product.objects.filter(pk__in=plain).update(
+            inventory=Case(
+                *[
+                    When(pk=product_id, then=F("inventory") + quantity)
+                    for product_id, quantity in plain.items()
+                ],
+                default=F("inventory"),
+            )
+        )
+        back_in = Q()
+        for product_id, quantity in plain.items():
+            back_in |= Q(pk=product_id, inventory=quantity)
+        facets.stock_moved(back_in=Product.objects.filter(back_in).count())
+    for product_id, shard_ids in shards.items():
+        StockShard.objects.filter(pk=random.choice(shard_ids)).update(
+            inventory=F("inventory") + quantities[product_id]
+        )
+
+    _stock_changed(quantities)
+
+
+def _shards_by_product(quantities):
+    shards = {}
+    for (shard_id, product_id) in StockShard.objects.filter(
+        product_id__in=quantities
+    ).values_list("pk", "product_id"):
+        shards.setdefault(product_id, []).append(shard_id)
+    return shards
+
+
+def _take_from_shards(product_id, shard_ids, quantity):
+    # start at a random shard so concurrent checkouts spread their writes
+    shard_ids = random.sample(shard_ids, len(shard_ids))
+    for shard_id in shard_ids:
+        if StockShard.objects.filter(pk=shard_id, inventory__gte=quantity).update(
+            inventory=F("inventory") - quantity
+        ):
+            return
+
+    # no single shard holds enough: lock them all and drain in order
+    with transaction.atomic():
+        locked = list(
+            StockShard.objects.select_for_update()
+            .filter(pk__in=shard_ids)
+            .order_by("pk")
+            .values_list("pk", "inventory")
+        )
+        if sum(inventory for (_, inventory) in locked) < quantity:
+            raise InsufficientStock([product_id])
+        remaining = quantity
+        for (shard_id, inventory) in locked:
+            taken = min(inventory, remaining)
+            if taken > 0:
+                StockShard.objects.filter(pk=shard_id).update(
+                    inventory=F("inventory") - taken
+                )
+                remaining -= taken
+            if remaining == 0:
+                break
+
+
+def _stock_changed(quantities):
+    bump_catalog(
+        Product.objects.filter(pk__in=quantities).values_list(
+            "collection_id", flat=True
+        )
+    )
+
+
+def reserve_cart(cart_id, quantities, ttl=RESERVATION_TTL):
+    """
+    Hold stock for the items of a cart until `ttl` runs out, replacing any
+    reservation the cart already had. Returns the expiry time.
+    """
+    with transaction.atomic():
+        release_cart(cart_id)
+        take_stock(quantities)
+        expires_at = timezone.now() + ttl
+        StockReservation.objects.bulk_create(
+            [
+                StockReservation(
+                    cart_id=cart_id,
+                    product_id=product_id,
+                    quantity=quantity,
+                    expires_at=expires_at,
+                )
+                for product_id, quantity in quantities.items()
+                if quantity > 0
+            ]
+        )
+    return expires_at
+
+
+def release_cart(cart_id):
+    with transaction.atomic():
+        _release(StockReservation.objects.filter(cart_id=cart_id))
+
+
+def release_carts(cart_ids):
+    with transaction.atomic():
+        return _release(StockReservation.objects.filter(cart_id__in=cart_ids))
+
+
+def release_expired(batch_size=1000, now=None):
+    """
+    Give back the stock of expired reservations, `batch_size` rows per
+    transaction. Returns the number of reservations released.
+    """
+    now = now or timezone.now()
+    released = 0
+    while True:
+        with transaction.atomic():
+            ids = list(
+                StockReservation.objects.select_for_update(skip_locked=True)
+                .filter(expires_at__lte=now)
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not ids:
+                return released
+            released += _release(StockReservation.objects.filter(pk__in=ids))
+
+
+def _release(reservations):
+    held = list(
+        reservations.select_for_update().values_list("pk", "product_id", "quantity")
+    )
+    if not held:
+        return 0
+    quantities = Counter()
+    for (_, product_id, quantity) in held:
+        quantities[product_id] += quantity
+    StockReservation.objects.filter(pk__in=[pk for (pk, _, _) in held]).delete()
+    return_stock(quantities)
+    return len(held)
+
+
+def checkout(cart_id, quantities):
+    """
+    Take stock for an order placed from a cart. Whatever the cart reserved is
+    consumed first (expired or not, it is still held until released), so
+    only the unreserved remainder competes for stock.
+    """
+    with transaction.atomic():
+        held = list(
+            StockReservation.objects.select_for_update()
+            .filter(cart_id=cart_id)
+            .values_list("pk", "product_id", "quantity")
+        )
+        reserved = Counter()
+        for (_, product_id, quantity) in held:
+            reserved[product_id] += quantity
+        if held:
+            StockReservation.objects.filter(
+                pk__in=[pk for (pk, _, _) in held]
+            ).delete()
+
+        needed = Counter(quantities)
+        needed.subtract(reserved)
+        take_stock({pk: qty for pk, qty in needed.items() if qty > 0})
+        return_stock({pk: -qty for pk, qty in needed.items() if qty < 0})
+
+
+def stripe_product(product_id, shards):
+    """
+    Spread a product's stock over `shards` counter rows (0 folds it back into
+    Product.inventory). Restock striped products by folding, updating
+    Product.inventory and striping again.
+    """
+    with transaction.atomic():
+        product = Product.objects.select_for_update().get(pk=product_id)
+        total = product.inventory
+        existing = StockShard.objects.filter(product_id=product_id)
+        if existing.exists():
+            total = existing.aggregate(total=Sum("inventory"))["total"]
+            existing.delete()
+        Product.objects.filter(pk=product_id).update(inventory=total)
+        if shards > 0:
+            (share, extra) = divmod(total, shards)
+            StockShard.objects.bulk_create(
+                [
+                    StockShard(
+                        product_id=product_id,
+                        shard=shard,
+                        inventory=share + (1 if shard < extra else 0),
+                    )
+                    for shard in range(shards)
+                ]
+            )
+        facets.rebuild([ProductFacet.FACET_STOCK])
+        _stock_changed([product_id])
+
+
+def sync_striped_inventory():
+    """Mirror shard totals into Product.inventory for display."""
+    totals = (
+        StockShard.objects.values("product_id")
+        .annotate(total=Sum("inventory"))
+        .values_list("product_id", "total")
+    )
+    totals = dict(totals)
+    if totals:
+        Product.objects.filter(pk__in=totals).update(
+            inventory=Case(
+                *[When(pk=pk, then=total) for pk, total in totals.items()],
+                default=F("inventory"),
+            )
+        )
+        facets.rebuild([ProductFacet.FACET_STOCK])
+        _stock_changed(totals)
+    return len(totals)
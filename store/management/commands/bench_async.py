@@ -0,0 +1,181 @@
+import asyncio
+import io
+import random
+import threading
+import time
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.test.utils import override_settings
+from store.bench import bench_database, run_concurrently, seed_store, summarize
+from store.carts import get_cart_store
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the sync WSGI read path against the async ASGI one (async/) "
+        "with many slow clients. Both handlers run in process on a throwaway "
+        "database; WSGI gets a fixed pool of worker threads, like a threaded "
+        "server would."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=200)
+        parser.add_argument("--iterations", type=int, default=10)
+        parser.add_argument(
+            "--threads", type=int, default=8, help="WSGI worker threads"
+        )
+        parser.add_argument(
+            "--client-delay",
+            type=float,
+            default=0.05,
+            help="Seconds a slow client takes to read each response",
+        )
+        parser.add_argument("--products", type=int, default=2000)
+        parser.add_argument("--reviews", type=int, default=10000)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        with bench_database(), override_settings(
+            DEBUG=False, ALLOWED_HOSTS=["testserver"]
+        ):
+            (self.product_ids, _) = seed_store(
+                rng,
+                products=options["products"],
+                reviews=options["reviews"],
+                customers=0,
+                orders=0,
+            )
+            store = get_cart_store()
+            self.cart_ids = []
+            for _ in range(20):
+                cart_id = store.create()
+                for product_id in rng.sample(self.product_ids, 3):
+                    store.add(cart_id, product_id, 1)
+                self.cart_ids.append(cart_id)
+
+            results = {
+                "wsgi": self.run_wsgi(options),
+                "asgi": self.run_asgi(options),
+            }
+        for name, result in results.items():
+            self.stdout.write(
+                "{name}: requests/s={rps} p50={p50_ms}ms p95={p95_ms}ms "
+                "p99={p99_ms}ms ok={ok} failed={failed} errors={errors}".format(
+                    name=name, **result
+                )
+            )
+
+    def path(self, client, i, prefix):
+        rng = random.Random(client * 1_000_003 + i)
+        return prefix + rng.choice(
+            [
+                "/products/{}/reviews/".format(rng.choice(self.product_ids)),
+                "/collections/",
+                "/carts/{}/".format(rng.choice(self.cart_ids)),
+            ]
+        )
+
+    def run_wsgi(self, options):
+        application = get_wsgi_application()
+        workers = threading.Semaphore(options["threads"])
+
+        def request(client, i):
+            status = []
+            with workers:
+                body = application(
+                    wsgi_environ(self.path(client, i, "")),
+                    lambda line, headers, exc_info=None: status.append(line),
+                )
+                try:
+                    b"".join(body)
+                    # the worker thread is held until the slow client has read it
+                    time.sleep(options["client_delay"])
+                finally:
+                    body.close()
+            return status[0].startswith("200")
+
+        return run_concurrently(options["clients"], options["iterations"], request)
+
+    def run_asgi(self, options):
+        application = get_asgi_application()
+        latencies = []
+        outcomes = {"ok": 0, "failed": 0, "errors": 0}
+
+        async def request(path):
+            status = []
+            finished = asyncio.Event()
+            messages = [{"type": "http.request", "body": b"", "more_body": False}]
+
+            async def receive():
+                if messages:
+                    return messages.pop()
+                await finished.wait()
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                if message["type"] == "http.response.start":
+                    status.append(message["status"])
+                elif not message.get("more_body"):
+                    # a slow client only holds a coroutine, not a thread
+                    await asyncio.sleep(options["client_delay"])
+                    finished.set()
+
+            await application(asgi_scope(path), receive, send)
+            return status[0] == 200
+
+        async def client(number):
+            for i in range(options["iterations"]):
+                start = time.perf_counter()
+                try:
+                    ok = await request(self.path(number, i, "/async"))
+                    outcome = "ok" if ok else "failed"
+                except Exception:
+                    outcome = "errors"
+                latencies.append(time.perf_counter() - start)
+                outcomes[outcome] += 1
+
+        async def main():
+            await asyncio.gather(*(client(n) for n in range(options["clients"])))
+
+        start = time.perf_counter()
+        asyncio.run(main())
+        return summarize(latencies, time.perf_counter() - start, **outcomes)
+
+
+def wsgi_environ(path):
+    return {
+        "REQUEST_METHOD": "GET",
+        "PATH_INFO": path,
+        "SCRIPT_NAME": "",
+        "QUERY_STRING": "",
+        "SERVER_NAME": "testserver",
+        "SERVER_PORT": "80",
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "REMOTE_ADDR": "127.0.0.1",
+        "wsgi.input": io.BytesIO(),
+        "wsgi.errors": io.StringIO(),
+        "wsgi.url_scheme": "http",
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+        "wsgi.version": (1, 0),
+    }
+
+
+def asgi_scope(path):
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"testserver")],
+        "client": ("127.0.0.1", 50000),
+        "server": ("testserver", 80),
+    }
@@ -0,0 +1,85 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from rest_framework.exceptions import ValidationError
+from store import inventory
+from store.bench import bench_database, run_concurrently
+from store.carts import get_cart_store
+from store.models import Collection, Product
+from store.serializer import CreateOrderSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure checkout throughput when many workers buy the same product, "
+        "with and without striped stock counters. Runs on a throwaway database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=16)
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--quantity", type=int, default=1)
+        parser.add_argument(
+            "--shards",
+            type=int,
+            nargs="+",
+            default=[0, 8],
+            help="Shard counts to compare; 0 keeps stock on the product row.",
+        )
+
+    def handle(self, *args, **options):
+        for shards in options["shards"]:
+            with bench_database():
+                result = self.run_one(
+                    shards,
+                    options["workers"],
+                    options["iterations"],
+                    options["quantity"],
+                )
+            self.stdout.write(
+                "shards={shards} checkouts/s={rps} p50={p50_ms}ms "
+                "p95={p95_ms}ms p99={p99_ms}ms ok={ok} sold_out={failed} "
+                "errors={errors} stock_left={stock_left}".format(
+                    shards=shards, **result
+                )
+            )
+
+    def run_one(self, shards, workers, iterations, quantity):
+        collection = Collection.objects.create(title="Bench")
+        # leave stock for 90% of the attempts so the sold-out path runs too
+        stock = int(workers * iterations * quantity * 0.9)
+        product = Product.objects.create(
+            title="Hot product",
+            slug="hot-product",
+            description="",
+            unit_price=10,
+            inventory=stock,
+            collection=collection,
+        )
+        if shards:
+            inventory.stripe_product(product.pk, shards)
+        User = get_user_model()
+        user_ids = [
+            User.objects.create(
+                username="bench{}".format(w), email="bench{}@example.com".format(w)
+            ).pk
+            for w in range(workers)
+        ]
+
+        def checkout(worker, i):
+            store = get_cart_store()
+            cart_id = store.create()
+            store.add(cart_id, product.pk, quantity)
+            serializer = CreateOrderSerializer(
+                data={"cart_id": cart_id}, context={"user_id": user_ids[worker]}
+            )
+            serializer.is_valid(raise_exception=True)
+            try:
+                serializer.save()
+            except ValidationError:
+                return False
+            return True
+
+        result = run_concurrently(workers, iterations, checkout)
+        inventory.sync_striped_inventory()
+        result["stock_left"] = Product.objects.get(pk=product.pk).inventory
+        return result
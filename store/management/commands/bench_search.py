@@ -0,0 +1,97 @@
+import random
+import time
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from store.bench import bench_database, summarize
+from store.models import Collection, Product
+from store.search import get_search_backend
+
+
+# a few thousand made-up words, so a term matches a realistic slice of the
+# catalog instead of half of it
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "ze", "pa", "qu", "do"]
+WORDS = sorted(
+    {a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES}
+    | {a + b for a in SYLLABLES for b in SYLLABLES}
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare full-text product search against icontains on a synthetic "
+        "catalog. Runs on a throwaway database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=1_000_000)
+        parser.add_argument("--queries", type=int, default=200)
+        parser.add_argument("--batch-size", type=int, default=10000)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        with bench_database():
+            start = time.perf_counter()
+            self.seed(rng, options["products"], options["batch_size"])
+            backend = get_search_backend()
+            if backend is not None:
+                backend.rebuild(Product.objects.all(), options["batch_size"])
+            self.stdout.write(
+                "Seeded and indexed {} products in {:.1f}s".format(
+                    options["products"], time.perf_counter() - start
+                )
+            )
+
+            queries = [
+                rng.sample(WORDS, rng.choice((1, 2))) for _ in range(options["queries"])
+            ]
+            self.report("icontains", queries, self.icontains)
+            if backend is not None:
+                self.report(
+                    type(backend).__name__,
+                    queries,
+                    lambda terms: backend.search(Product.objects.all(), terms).order_by(
+                        "-search_rank", "id"
+                    ),
+                )
+
+    def seed(self, rng, count, batch_size):
+        collections = Collection.objects.bulk_create(
+            [Collection(title="Collection {}".format(i)) for i in range(20)]
+        )
+        for offset in range(0, count, batch_size):
+            Product.objects.bulk_create(
+                [
+                    Product(
+                        title=" ".join(rng.sample(WORDS, 3)),
+                        slug="product-{}".format(offset + i),
+                        description=" ".join(rng.choices(WORDS, k=40)),
+                        unit_price=rng.randint(100, 10000) / 100,
+                        inventory=rng.randint(0, 100),
+                        collection=rng.choice(collections),
+                    )
+                    for i in range(min(batch_size, count - offset))
+                ]
+            )
+
+    def icontains(self, terms):
+        queryset = Product.objects.all()
+        for term in terms:
+            queryset = queryset.filter(
+                Q(title__icontains=term) | Q(description__icontains=term)
+            )
+        return queryset.order_by("id")
+
+    def report(self, name, queries, search):
+        latencies = []
+        start = time.perf_counter()
+        for terms in queries:
+            began = time.perf_counter()
+            # a first page, the way ProductViewSet would serve it
+            list(search(terms).values_list("id", flat=True)[:20])
+            latencies.append(time.perf_counter() - began)
+        result = summarize(latencies, time.perf_counter() - start)
+        self.stdout.write(
+            "{name}: queries/s={rps} p50={p50_ms}ms p95={p95_ms}ms "
+            "p99={p99_ms}ms".format(name=name, **result)
+        )
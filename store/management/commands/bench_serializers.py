@@ -0,0 +1,104 @@
+import random
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Prefetch
+from rest_framework.renderers import JSONRenderer
+from store.bench import bench_database, seed_store
+from store.carts import get_cart_store
+from store.compiled import compiled
+from store.models import Order, OrderItem, Product
+from store.renderers import FastJSONRenderer, orjson
+from store.serializer import (
+    CartSerializer,
+    FlatOrderSerializer,
+    OrderSerializer,
+    ProductSerializer,
+    serialize_product_rows,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the DRF serializers and JSONRenderer against the compiled "
+        "serializers and FastJSONRenderer on the hot read paths (a product "
+        "page, a cart, an order page), fetch included, on a throwaway "
+        "database. Fails if the two ever render different bytes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=200)
+        parser.add_argument("--page-size", type=int, default=100)
+        parser.add_argument("--cart-items", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        size = options["page_size"]
+        with bench_database():
+            (product_ids, _) = seed_store(
+                rng, products=max(size * 5, 1000), customers=20, orders=size * 2
+            )
+            store = get_cart_store()
+            cart_id = store.create()
+            for product_id in rng.sample(product_ids, options["cart_items"]):
+                store.add(cart_id, product_id, rng.randint(1, 3))
+
+            paths = {
+                "products": (
+                    lambda: ProductSerializer(
+                        Product.objects.order_by("id")[:size], many=True
+                    ).data,
+                    lambda: serialize_product_rows(
+                        Product.objects.order_by("id").values(
+                            *compiled(ProductSerializer, rows=True).columns
+                        )[:size]
+                    ),
+                ),
+                "cart": (
+                    lambda: CartSerializer(store.get(cart_id)).data,
+                    lambda: compiled(CartSerializer)(store.get(cart_id)),
+                ),
+                "orders": (
+                    lambda: OrderSerializer(
+                        Order.objects.order_by("id").prefetch_related(
+                            Prefetch(
+                                "items",
+                                OrderItem.objects.select_related("product"),
+                            )
+                        )[:size],
+                        many=True,
+                    ).data,
+                    lambda: FlatOrderSerializer(
+                        list(
+                            Order.objects.order_by("id").values(
+                                *FlatOrderSerializer.order_fields()
+                            )[:size]
+                        )
+                    ).data,
+                ),
+            }
+            self.stdout.write(
+                "JSON encoder: {}".format("orjson" if orjson else "stdlib json")
+            )
+            for name, (drf, fast) in paths.items():
+                self.compare(name, drf, fast, options["iterations"])
+
+    def compare(self, name, drf, fast, iterations):
+        expected = JSONRenderer().render(drf())
+        if FastJSONRenderer().render(fast()) != expected:
+            raise CommandError("{}: compiled output differs from DRF's".format(name))
+        before = timed(lambda: JSONRenderer().render(drf()), iterations)
+        after = timed(lambda: FastJSONRenderer().render(fast()), iterations)
+        self.stdout.write(
+            "{}: drf={:.3f}ms compiled={:.3f}ms speedup={:.2f}x ({} bytes)".format(
+                name, before * 1000, after * 1000, before / after, len(expected)
+            )
+        )
+
+
+def timed(task, iterations):
+    task()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        task()
+    return (time.perf_counter() - start) / iterations
@@ -0,0 +1,255 @@
+import json
+import random
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+from store.bench import bench_database, run_concurrently, seed_store
+
+
+SCENARIOS = ["browse", "add", "checkout"]
+# product lists are only paginated when a page size is asked for
+PAGE_SIZE = 20
+
+
+class InProcessClient:
+    def __init__(self, user=None):
+        self.client = APIClient()
+        if user is not None:
+            self.client.force_authenticate(user)
+
+    def request(self, method, path, data=None):
+        if method == "get":
+            response = self.client.get(path)
+        else:
+            response = getattr(self.client, method)(path, data, format="json")
+        body = None
+        if response.get("Content-Type", "").startswith("application/json"):
+            body = response.json()
+        return response.status_code, body
+
+
+class HttpClient:
+    def __init__(self, base_url, token=None):
+        self.base_url = base_url.rstrip("/")
+        self.headers = {"Content-Type": "application/json"}
+        if token:
+            self.headers["Authorization"] = "JWT {}".format(token)
+
+    def request(self, method, path, data=None):
+        request = Request(
+            self.base_url + path,
+            data=json.dumps(data).encode() if data is not None else None,
+            headers=self.headers,
+            method=method.upper(),
+        )
+        try:
+            with urlopen(request) as response:
+                (status, content) = (response.status, response.read())
+        except HTTPError as error:
+            (status, content) = (error.code, error.read())
+        try:
+            return status, json.loads(content)
+        except ValueError:
+            return status, None
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive the store API with concurrent simulated shoppers (browse, add "
+        "to cart, checkout) and report requests/s and latency percentiles per "
+        "scenario. In-process runs seed a synthetic store in a throwaway "
+        "database; --server runs against a live site's existing catalog."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS
+        )
+        parser.add_argument("--workers", type=int, default=8)
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument("--collections", type=int, default=20)
+        parser.add_argument("--products", type=int, default=5000)
+        parser.add_argument("--promotions", type=int, default=10)
+        parser.add_argument("--reviews", type=int, default=10000)
+        parser.add_argument("--customers", type=int, default=200)
+        parser.add_argument("--orders", type=int, default=2000)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--server", help="Base URL of a running site, e.g. http://127.0.0.1:8000"
+        )
+        parser.add_argument(
+            "--token", help="JWT access token used for checkout with --server"
+        )
+        parser.add_argument("--save", help="Write the results to this JSON file")
+        parser.add_argument(
+            "--compare", help="Compare against results saved earlier with --save"
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=10.0,
+            help="Percent drop in requests/s or rise in p95 counted as a regression",
+        )
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        if options["server"]:
+            results = self.run_scenarios(options, self.server_clients(options))
+        else:
+            with bench_database(), override_settings(
+                DEBUG=False, ALLOWED_HOSTS=["testserver"]
+            ):
+                results = self.run_scenarios(options, self.local_clients(options))
+
+        for scenario, result in results.items():
+            self.stdout.write(
+                "{scenario}: requests/s={rps} p50={p50_ms}ms p95={p95_ms}ms "
+                "p99={p99_ms}ms ok={ok} failed={failed} errors={errors}".format(
+                    scenario=scenario, **result
+                )
+            )
+        if options["save"]:
+            with open(options["save"], "w") as baseline:
+                json.dump(results, baseline, indent=2)
+        if options["compare"]:
+            self.compare(results, options["compare"], options["tolerance"])
+
+    def local_clients(self, options):
+        (self.product_ids, user_ids) = seed_store(
+            self.rng,
+            collections=options["collections"],
+            products=options["products"],
+            promotions=options["promotions"],
+            reviews=options["reviews"],
+            customers=max(options["customers"], options["workers"]),
+            orders=options["orders"],
+        )
+        self.pages = max(1, -(-options["products"] // PAGE_SIZE))
+        users = get_user_model().objects.filter(pk__in=user_ids[: options["workers"]])
+        return [InProcessClient(user) for user in users]
+
+    def server_clients(self, options):
+        client = HttpClient(options["server"], options["token"])
+        (status, page) = client.request(
+            "get", "/products/?page_size={}".format(PAGE_SIZE)
+        )
+        # a server without StorePagination sends the bare list
+        products = page if isinstance(page, list) else (page or {}).get("results")
+        if status != 200 or not products:
+            raise CommandError(
+                "{} has no products to browse".format(options["server"])
+            )
+        self.product_ids = [product["id"] for product in products]
+        count = len(products) if isinstance(page, list) else page["count"]
+        self.pages = max(1, -(-count // PAGE_SIZE))
+        if "checkout" in options["scenarios"] and not options["token"]:
+            raise CommandError("checkout against --server needs --token")
+        return [
+            HttpClient(options["server"], options["token"])
+            for _ in range(options["workers"])
+        ]
+
+    def run_scenarios(self, options, clients):
+        results = {}
+        for scenario in options["scenarios"]:
+            task = getattr(self, "prepare_{}".format(scenario))(
+                clients, options["iterations"]
+            )
+            results[scenario] = run_concurrently(
+                len(clients), options["iterations"], task
+            )
+        return results
+
+    def prepare_browse(self, clients, iterations):
+        def browse(worker, i):
+            rng = random.Random(worker * iterations + i)
+            product_id = rng.choice(self.product_ids)
+            path = rng.choice(
+                [
+                    "/products/?page_size={}&page={}".format(
+                        PAGE_SIZE, rng.randint(1, self.pages)
+                    ),
+                    "/products/{}/".format(product_id),
+                    "/products/{}/reviews/".format(product_id),
+                    "/products/facets/",
+                    "/collections/",
+                ]
+            )
+            (status, body) = clients[worker].request("get", path)
+            return status == 200
+
+        return browse
+
+    def new_cart(self, client):
+        (status, cart) = client.request("post", "/carts/", {})
+        if status != 201:
+            raise CommandError("couldn't create a cart: {}".format(status))
+        return cart["id"]
+
+    def prepare_add(self, clients, iterations):
+        carts = [self.new_cart(client) for client in clients]
+
+        def add(worker, i):
+            rng = random.Random(worker * iterations + i)
+            (status, body) = clients[worker].request(
+                "post",
+                "/carts/{}/items/".format(carts[worker]),
+                {"product_id": rng.choice(self.product_ids), "quantity": 1},
+            )
+            return status == 201
+
+        return add
+
+    def prepare_checkout(self, clients, iterations):
+        # carts are filled up front so only OrderViewSet.create is timed
+        carts = []
+        for client in clients:
+            carts.append([])
+            for _ in range(iterations):
+                cart_id = self.new_cart(client)
+                for product_id in self.rng.sample(self.product_ids, 3):
+                    client.request(
+                        "post",
+                        "/carts/{}/items/".format(cart_id),
+                        {"product_id": product_id, "quantity": 1},
+                    )
+                carts[-1].append(cart_id)
+
+        def checkout(worker, i):
+            (status, body) = clients[worker].request(
+                "post", "/orders/", {"cart_id": carts[worker][i]}
+            )
+            return status == 200
+
+        return checkout
+
+    def compare(self, results, path, tolerance):
+        with open(path) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = []
+        for scenario, result in results.items():
+            before = baseline.get(scenario)
+            if before is None:
+                continue
+            rps = percent_change(before["rps"], result["rps"])
+            p95 = percent_change(before["p95_ms"], result["p95_ms"])
+            self.stdout.write(
+                "{}: requests/s {:+.1f}% p95 {:+.1f}%".format(scenario, rps, p95)
+            )
+            if rps < -tolerance or p95 > tolerance:
+                regressions.append(scenario)
+        if regressions:
+            raise CommandError(
+                "Slower than {} beyond {}%: {}".format(
+                    path, tolerance, ", ".join(regressions)
+                )
+            )
+
+
+def percent_change(before, after):
+    if not before:
+        return 0.0
+    return (after - before) / before * 100
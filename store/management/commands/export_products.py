@@ -0,0 +1,50 @@
+import resource
+import sys
+import time
+from django.core.management.base import BaseCommand
+from store.catalog import export_rows, write_rows
+from store.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Dump every product as CSV or JSON Lines (to a file or - for stdout) "
+        "through a server-side cursor."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=["csv", "jsonl"])
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or ("jsonl" if path.endswith(".jsonl") else "csv")
+
+        start = time.perf_counter()
+        exported = 0
+
+        def counted(rows):
+            nonlocal exported
+            for row in rows:
+                exported += 1
+                yield row
+
+        rows = counted(export_rows(Product.objects.all(), options["chunk_size"]))
+        if path == "-":
+            write_rows(sys.stdout, fmt, rows)
+        else:
+            with open(path, "w", newline="", encoding="utf-8") as stream:
+                write_rows(stream, fmt, rows)
+        elapsed = time.perf_counter() - start
+
+        # keep the report off stdout when stdout is the export itself
+        report = self.stderr if path == "-" else self.stdout
+        report.write(
+            "exported={} rows/s={:.0f} seconds={:.1f} peak_rss_mb={:.1f}".format(
+                exported,
+                exported / elapsed if elapsed else 0,
+                elapsed,
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            )
+        )
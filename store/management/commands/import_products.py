@@ -0,0 +1,48 @@
+import resource
+import sys
+import time
+from django.core.management.base import BaseCommand, CommandError
+from store.catalog import ProductImporter, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream products from a CSV or JSON Lines file (or - for stdin) and "
+        "upsert them by slug in batches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=["csv", "jsonl"])
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or ("jsonl" if path.endswith(".jsonl") else "csv")
+        if path == "-" and not options["format"]:
+            raise CommandError("--format is required when reading from stdin")
+
+        importer = ProductImporter(batch_size=options["batch_size"])
+        start = time.perf_counter()
+        stream = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+        try:
+            importer.run(read_rows(stream, fmt))
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        elapsed = time.perf_counter() - start
+
+        for line_number, error in importer.errors[:20]:
+            self.stderr.write("line {}: {}".format(line_number, error))
+        rows = importer.created + importer.updated
+        self.stdout.write(
+            "created={} updated={} rejected={} rows/s={:.0f} seconds={:.1f} "
+            "peak_rss_mb={:.1f}".format(
+                importer.created,
+                importer.updated,
+                len(importer.errors),
+                rows / elapsed if elapsed else 0,
+                elapsed,
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            )
+        )
@@ -0,0 +1,51 @@
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from store.carts import get_cart_store
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete carts idle for longer than --days, in bounded batches, giving "
+        "back any stock they reserved. Safe to run from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=float,
+            default=getattr(settings, "STORE_CART_MAX_IDLE_DAYS", 30),
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0.0,
+            help="Seconds to sleep between batches to let other writers in",
+        )
+
+    def handle(self, *args, **options):
+        idle_since = timezone.now() - timedelta(days=options["days"])
+        (carts, items, lock_wait, batches) = (0, 0, 0.0, 0)
+        start = time.perf_counter()
+        for batch in get_cart_store().purge(idle_since, options["batch_size"]):
+            carts += batch[0]
+            items += batch[1]
+            lock_wait += batch[2]
+            batches += 1
+            if options["pause"]:
+                time.sleep(options["pause"])
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            "Purged {} carts and {} items in {} batches, {:.1f}s "
+            "({:.0f} rows/s, {:.3f}s waiting for locks)".format(
+                carts,
+                items,
+                batches,
+                elapsed,
+                (carts + items) / elapsed if elapsed else 0,
+                lock_wait,
+            )
+        )
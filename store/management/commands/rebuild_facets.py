@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from store import facets
+
+
+class Command(BaseCommand):
+    help = "Recount the product facet index from the product table."
+
+    def handle(self, *args, **options):
+        facets.rebuild()
+        self.stdout.write("Rebuilt product facet index")
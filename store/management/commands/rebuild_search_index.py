@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from store.models import Product
+from store.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the product full-text search index from scratch."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        if backend is None:
+            self.stdout.write("No full-text backend for this database, nothing to do")
+            return
+        backend.rebuild(Product.objects.all(), batch_size=options["batch_size"])
+        self.stdout.write(
+            "Rebuilt search index with {}".format(type(backend).__name__)
+        )
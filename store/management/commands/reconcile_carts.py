@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from store.carts import reconcile_cart_totals
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored subtotal and item count of every cart."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        processed = reconcile_cart_totals(batch_size=options["batch_size"])
+        self.stdout.write("Reconciled {} carts".format(processed))
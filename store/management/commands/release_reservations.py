@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from store import inventory
+
+
+class Command(BaseCommand):
+    help = "Give back the stock held by expired cart reservations."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        released = inventory.release_expired(batch_size=options["batch_size"])
+        synced = inventory.sync_striped_inventory()
+        self.stdout.write(
+            "Released {} reservations, synced {} striped products".format(
+                released, synced
+            )
+        )
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from store.cache import bump_catalog
+from store.catalog import resync_products_count, resync_reviews_count
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount the stored number of products in every collection and of "
+        "reviews on every product."
+    )
+
+    def handle(self, *args, **options):
+        collections = resync_products_count()
+        products = resync_reviews_count()
+        bump_catalog()
+        self.stdout.write(
+            "Resynced {} collections and {} products".format(collections, products)
+        )
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from store import inventory
+from store.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Spread a hot product's stock over several counter rows. "
+        "Use --shards 0 to fold it back into Product.inventory."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("product_id", type=int)
+        parser.add_argument("--shards", type=int, default=8)
+
+    def handle(self, *args, **options):
+        try:
+            inventory.stripe_product(options["product_id"], options["shards"])
+        except Product.DoesNotExist:
+            raise CommandError("No product with this id is found")
+        self.stdout.write(
+            "Product {} now uses {} stock shards".format(
+                options["product_id"], options["shards"]
+            )
+        )
@@ -0,0 +1,138 @@
+from time import perf_counter
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connection
+from . import telemetry
+
+
+class RequestTiming:
+    __slots__ = ("queries", "db", "view_start", "view", "render_start", "render")
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.view_start = None
+        self.view = None
+        self.render_start = None
+        self.render = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += perf_counter() - start
+            self.queries += 1
+
+    def rendered(self, response):
+        self.render = perf_counter() - self.render_start
+
+
+def add_execute_wrapper(wrapper):
+    connection.execute_wrappers.append(wrapper)
+
+
+def remove_execute_wrapper(wrapper):
+    connection.execute_wrappers.remove(wrapper)
+
+
+def route_name(view_func, method):
+    cls = getattr(view_func, "cls", None)
+    if cls is None:
+        return "{}.{}".format(view_func.__module__, view_func.__name__)
+    actions = getattr(view_func, "actions", None)
+    if actions:
+        return "{}.{}".format(cls.__name__, actions.get(method.lower(), method.lower()))
+    return "{}.{}".format(cls.__name__, method.lower())
+
+
+class TelemetryMiddleware:
+    """
+    Times every routed request: DB queries and time (through an execute
+    wrapper), the view, and rendering of template/DRF responses. The numbers
+    go into per-route histograms in store.telemetry, and out as a
+    Server-Timing header when STORE_SERVER_TIMING is on (by default only
+    with DEBUG, since the header tells any client how long the database
+    took).
+
+    Streaming responses are measured up to the point the view returns; what
+    the body does while it streams isn't counted.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.headers = getattr(settings, "STORE_SERVER_TIMING", settings.DEBUG)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        timing = self.start(request)
+        start = perf_counter()
+        with connection.execute_wrapper(timing):
+            response = self.get_response(request)
+        return self.finish(request, response, perf_counter() - start)
+
+    async def __acall__(self, request):
+        timing = self.start(request)
+        start = perf_counter()
+        # the async ORM runs queries in this request's sync thread, so the
+        # wrapper has to be installed on that thread's connection
+        await sync_to_async(add_execute_wrapper)(timing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(remove_execute_wrapper)(timing)
+        return self.finish(request, response, perf_counter() - start)
+
+    def start(self, request):
+        request._timing = RequestTiming()
+        request._timing_route = None
+        return request._timing
+
+    def finish(self, request, response, total):
+        timing = request._timing
+        if timing.view is None and timing.view_start is not None:
+            timing.view = perf_counter() - timing.view_start
+        if self.headers:
+            response["Server-Timing"] = self.server_timing(timing, total)
+        if request._timing_route is not None:
+            telemetry.record(
+                request._timing_route,
+                total_ms=total * 1000,
+                view_ms=timing.view * 1000 if timing.view is not None else None,
+                render_ms=timing.render * 1000 if timing.render is not None else None,
+                db_ms=timing.db * 1000,
+                queries=timing.queries,
+                bytes=None if response.streaming else len(response.content),
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._timing_route = route_name(view_func, request.method)
+        request._timing.view_start = perf_counter()
+
+    def process_template_response(self, request, response):
+        timing = request._timing
+        now = perf_counter()
+        if timing.view_start is not None:
+            timing.view = now - timing.view_start
+        timing.render_start = now
+        response.add_post_render_callback(timing.rendered)
+        return response
+
+    def server_timing(self, timing, total):
+        metrics = [
+            'db;dur={:.2f};desc="{} queries"'.format(timing.db * 1000, timing.queries)
+        ]
+        if timing.view is not None:
+            metrics.append("view;dur={:.2f}".format(timing.view * 1000))
+        if timing.render is not None:
+            metrics.append("render;dur={:.2f}".format(timing.render * 1000))
+        metrics.append("total;dur={:.2f}".format(total * 1000))
+        return ", ".join(metrics)
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.2 on 2026-10-17 17:19
+
+from django.db import migrations, models
+
+
+def fill_cart_totals(apps, schema_editor):
+    Cart = apps.get_model("store", "Cart")
+    CartItem = apps.get_model("store", "CartItem")
+    totals = {}
+    for cart_id, quantity, unit_price in CartItem.objects.values_list(
+        "cart_id", "quantity", "product__unit_price"
+    ).iterator():
+        (subtotal, item_count) = totals.get(cart_id, (0, 0))
+        totals[cart_id] = (subtotal + quantity * unit_price, item_count + quantity)
+    Cart.objects.bulk_update(
+        [
+            Cart(pk=cart_id, subtotal=subtotal, item_count=item_count)
+            for cart_id, (subtotal, item_count) in totals.items()
+        ],
+        ["subtotal", "item_count"],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0005_stockreservation_stockshard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.RunPython(fill_cart_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.1.2 on 2026-10-17 17:21
+
+from django.db import migrations
+
+FTS_TABLE = "store_product_fts"
+PG_INDEX = "store_product_search_idx"
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE {fts} USING fts5("
+            "title, description, tokenize='unicode61 remove_diacritics 2')".format(
+                fts=FTS_TABLE
+            )
+        )
+        schema_editor.execute(
+            "INSERT INTO {fts}(rowid, title, description) "
+            "SELECT id, title, description FROM store_product".format(fts=FTS_TABLE)
+        )
+    elif vendor == "postgresql":
+        from django.contrib.postgres.indexes import GinIndex
+        from django.contrib.postgres.search import SearchVector
+
+        Product = apps.get_model("store", "Product")
+        schema_editor.add_index(
+            Product,
+            GinIndex(
+                SearchVector("title", weight="A", config="english")
+                + SearchVector("description", weight="B", config="english"),
+                name=PG_INDEX,
+            ),
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute("DROP TABLE {fts}".format(fts=FTS_TABLE))
+    elif vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS {}".format(PG_INDEX))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0006_cart_subtotal_item_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.1.2 on 2026-10-17 17:26
+
+from collections import Counter
+from decimal import Decimal
+from django.db import migrations, models
+
+PRICE_BANDS = [Decimal(edge) for edge in ("0", "10", "25", "50", "100")]
+
+
+def price_band(unit_price):
+    label = None
+    for low, high in zip(PRICE_BANDS, PRICE_BANDS[1:] + [None]):
+        if unit_price >= low:
+            label = "{}-{}".format(low, high) if high is not None else "{}+".format(low)
+    return label
+
+
+def fill_facets(apps, schema_editor):
+    Product = apps.get_model("store", "Product")
+    ProductFacet = apps.get_model("store", "ProductFacet")
+    counts = Counter()
+    for collection_id, unit_price, inventory in Product.objects.values_list(
+        "collection_id", "unit_price", "inventory"
+    ).iterator():
+        counts[("collection", str(collection_id))] += 1
+        counts[("stock", "in_stock" if inventory > 0 else "out_of_stock")] += 1
+        band = price_band(unit_price)
+        if band is not None:
+            counts[("price", band)] += 1
+    for promotion_id in Product.promotion.through.objects.values_list(
+        "promotion_id", flat=True
+    ).iterator():
+        counts[("promotion", str(promotion_id))] += 1
+    ProductFacet.objects.bulk_create(
+        [
+            ProductFacet(facet=facet, value=value, count=count)
+            for (facet, value), count in counts.items()
+        ]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0007_product_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facet', models.CharField(max_length=20)),
+                ('value', models.CharField(max_length=50)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('facet', 'value')},
+            },
+        ),
+        migrations.RunPython(fill_facets, migrations.RunPython.noop),
+    ]
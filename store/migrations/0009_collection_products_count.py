@@ -0,0 +1,34 @@
+# Generated by Django 5.1.2 on 2026-10-17 17:28
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_products_count(apps, schema_editor):
+    Collection = apps.get_model("store", "Collection")
+    Product = apps.get_model("store", "Product")
+    counts = (
+        Product.objects.filter(collection=OuterRef("pk"))
+        .order_by()
+        .values("collection")
+        .annotate(count=Count("id"))
+        .values("count")
+    )
+    Collection.objects.update(products_count=Coalesce(Subquery(counts), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0008_productfacet'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='collection',
+            name='products_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_products_count, migrations.RunPython.noop),
+    ]
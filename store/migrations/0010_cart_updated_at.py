@@ -0,0 +1,26 @@
+# Generated by Django 5.1.2 on 2026-10-17 17:42
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_updated_at(apps, schema_editor):
+    # best guess for existing carts: idle since they were created
+    Cart = apps.get_model("store", "Cart")
+    Cart.objects.update(updated_at=F("created_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0009_collection_products_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.RunPython(fill_updated_at, migrations.RunPython.noop),
+    ]
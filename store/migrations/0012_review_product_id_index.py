@@ -0,0 +1,17 @@
+# Generated by Django 5.1.2 on 2026-10-17 17:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0011_product_reviews_count'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['product', 'id'], name='store_revie_product_650e93_idx'),
+        ),
+    ]
@@ -14,6 +14,8 @@ class Collection(models.Model):
     feature_product = models.ForeignKey(
         "Product", on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
     )
+    # kept in step with the products by store.catalog so listing doesn't count
+    products_count = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return self.title
@@ -33,6 +35,7 @@ class Product(models.Model):
         Collection, on_delete=models.PROTECT, related_name="products"
     )
     promotion = models.ManyToManyField(Promotion, blank=True)
+    reviews_count = models.PositiveIntegerField(default=0, db_index=True)
 
     def __str__(self):
         return self.title
@@ -97,6 +100,11 @@ class OrderItem(models.Model):
 class Cart(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid4)
     created_at = models.DateTimeField(auto_now_add=True)
+    # bumped by every item change, so idle carts can be found and purged
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # kept in step with the items by store.carts so reads don't re-add them
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    item_count = models.PositiveIntegerField(default=0)
 
 
 class CartItem(models.Model):
@@ -115,3 +123,40 @@ class Review(models.Model):
     name = models.CharField(max_length=255)
     description = models.TextField()
     date = models.DateField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["product", "id"])]
+
+
+class StockReservation(models.Model):
+    # a plain UUID instead of a FK so a reservation can outlive its cart
+    # row long enough to give the stock back
+    cart_id = models.UUIDField(db_index=True)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+
+
+class StockShard(models.Model):
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="stock_shards"
+    )
+    shard = models.PositiveSmallIntegerField()
+    inventory = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = [["product", "shard"]]
+
+
+class ProductFacet(models.Model):
+    FACET_COLLECTION = "collection"
+    FACET_PRICE = "price"
+    FACET_PROMOTION = "promotion"
+    FACET_STOCK = "stock"
+
+    facet = models.CharField(max_length=20)
+    value = models.CharField(max_length=50)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = [["facet", "value"]]
@@ -0,0 +1,124 @@
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+    BasePagination,
+    CursorPagination,
+    PageNumberPagination,
+)
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(CursorPagination):
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    ordering = "id"
+
+    def get_ordering(self, request, queryset, view):
+        if not any(hasattr(f, "get_ordering") for f in view.filter_backends):
+            self.ordering = getattr(view, "ordering", None) or self.ordering
+        ordering = list(super().get_ordering(request, queryset, view))
+        # id breaks ties so rows sharing a price/timestamp keep a stable order
+        tie_breaker = "-id" if ordering[0].startswith("-") else "id"
+        if not {"id", "-id", "pk", "-pk"} & set(ordering):
+            ordering.append(tie_breaker)
+        return tuple(ordering)
+
+
+class ReviewPagination(KeysetPagination):
+    # newest first, read backwards off the (product, id) index. Review.date
+    # is set on insert, so id order is date order, and a cursor on the unique
+    # id never falls back to an offset the way one on a shared date does
+    ordering = "-id"
+
+
+class CountlessPageNumberPagination(PageNumberPagination):
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    count_query_param = "count"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.skip_count = request.query_params.get(self.count_query_param) in (
+            "0",
+            "false",
+        )
+        if not self.skip_count:
+            return super().paginate_queryset(queryset, request, view)
+
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        try:
+            self.number = int(request.query_params.get(self.page_query_param, 1))
+        except ValueError:
+            raise NotFound(self.invalid_page_message)
+        if self.number < 1:
+            raise NotFound(self.invalid_page_message)
+
+        # fetch one extra row instead of running COUNT(*) to find the next page
+        offset = (self.number - 1) * page_size
+        rows = list(queryset[offset : offset + page_size + 1])
+        self.request = request
+        self.has_next = len(rows) > page_size
+        return rows[:page_size]
+
+    def get_paginated_response(self, data):
+        if not self.skip_count:
+            return super().get_paginated_response(data)
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def get_next_link(self):
+        if not self.skip_count:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.page_query_param, self.number + 1)
+
+    def get_previous_link(self):
+        if not self.skip_count:
+            return super().get_previous_link()
+        if self.number == 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.number == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, self.number - 1)
+
+
+class StorePagination(BasePagination):
+    """
+    Page numbers by default, keyset pagination with ?pagination=cursor.
+    Add ?count=false to page-number requests to skip the COUNT(*) query.
+    """
+
+    mode_query_param = "pagination"
+
+    @classmethod
+    def cursor_requested(cls, request):
+        params = request.query_params
+        return params.get(cls.mode_query_param) == "cursor" or "cursor" in params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_requested(request):
+            self.paginator = KeysetPagination()
+        else:
+            self.paginator = CountlessPageNumberPagination()
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+    @property
+    def display_page_controls(self):
+        paginator = getattr(self, "paginator", None)
+        return getattr(paginator, "display_page_controls", False)
+
+    def to_html(self):
+        return self.paginator.to_html()
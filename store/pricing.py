@@ -0,0 +1,81 @@
+from decimal import ROUND_HALF_UP, Decimal
+from django.conf import settings
+from rest_framework.exceptions import ValidationError
+from .models import Product
+
+
+CENT = Decimal("0.01")
+TAX_RATES = {
+    region: Decimal(str(rate))
+    for region, rate in getattr(
+        settings, "STORE_TAX_RATES", {"default": "0.10"}
+    ).items()
+}
+DEFAULT_REGION = getattr(settings, "STORE_DEFAULT_REGION", "default")
+
+
+def to_cents(amount):
+    return amount.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def tax_rate(region=None):
+    region = region or DEFAULT_REGION
+    try:
+        return TAX_RATES[region]
+    except KeyError:
+        raise ValidationError({"region": ["Unknown region {!r}.".format(region)]})
+
+
+def discount_rows(product_ids):
+    return Product.promotion.through.objects.filter(
+        product_id__in=product_ids
+    ).values_list("product_id", "promotion__discount")
+
+
+class PriceCalculator:
+    """
+    Tax and promotion prices for a batch of products. The best discount of
+    each product is loaded with one query for the whole batch; the rest is
+    Decimal arithmetic, rounded half up to the cent.
+    """
+
+    def __init__(self, products, region=None):
+        self.rate = tax_rate(region)
+        self.discounts = {}
+        if products:
+            self.load([product.pk for product in products])
+
+    @classmethod
+    async def aload(cls, products, region=None):
+        calculator = cls([], region)
+        async for product_id, discount in discount_rows(
+            [product.pk for product in products]
+        ):
+            calculator.add_discount(product_id, discount)
+        return calculator
+
+    def load(self, product_ids):
+        for product_id, discount in discount_rows(product_ids):
+            self.add_discount(product_id, discount)
+
+    def add_discount(self, product_id, discount):
+        # FloatField: go through str() so 0.1 stays exactly 0.1
+        discount = min(max(Decimal(str(discount)), Decimal(0)), Decimal(1))
+        if discount > self.discounts.get(product_id, Decimal(0)):
+            self.discounts[product_id] = discount
+
+    def with_tax(self, amount):
+        return to_cents(amount * (1 + self.rate))
+
+    def prices(self, product):
+        return self.prices_for(product.pk, product.unit_price)
+
+    def prices_for(self, product_id, unit_price):
+        discount = self.discounts.get(product_id, Decimal(0))
+        effective = to_cents(unit_price * (1 - discount))
+        return {
+            "price_with_tax": self.with_tax(unit_price),
+            "discount": discount,
+            "effective_price": effective,
+            "effective_price_with_tax": self.with_tax(effective),
+        }
@@ -0,0 +1,45 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer through orjson when it is installed, the stdlib encoder
+    otherwise. What orjson doesn't handle natively (Decimal, datetimes, lazy
+    strings) goes through DRF's encoder, so the bytes match JSONRenderer's.
+    Indented or ASCII-only output, and payloads orjson rejects, are left to
+    JSONRenderer itself.
+
+    orjson writes floats from 1e16 up as 1e16 where json writes 1e+16;
+    prices and discounts never get there.
+    """
+
+    encoder = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None
+            or data is None
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {})
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(
+                data,
+                default=self.encoder.default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME
+                | orjson.OPT_PASSTHROUGH_DATACLASS,
+            )
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # the same escapes JSONRenderer adds for embedding in <script>
+        return ret.replace("\u2028".encode(), b"\\u2028").replace(
+            "\u2029".encode(), b"\\u2029"
+        )
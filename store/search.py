@@ -0,0 +1,163 @@
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils.module_loading import import_string
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import SearchFilter
+from rest_framework.settings import api_settings
+from .pagination import StorePagination
+
+
+FTS_TABLE = "store_product_fts"
+PG_INDEX = "store_product_search_idx"
+PG_CONFIG = "english"
+
+
+class SQLiteSearchBackend:
+    """
+    FTS5 table keyed by product id, kept in sync by the Product signals.
+    Bulk writes that skip signals should call index() or rebuild().
+    """
+
+    def search(self, queryset, terms):
+        # quote every term so user input can't inject FTS5 syntax, and allow
+        # prefix matches the way icontains did
+        match = " ".join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+        qn = connection.ops.quote_name
+        # a join (rather than a correlated subquery per row) lets FTS5 run the
+        # MATCH once and hand back bm25 for every hit in the same pass
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[
+                "{fts}.rowid = {product}.{pk}".format(
+                    fts=FTS_TABLE,
+                    product=qn(queryset.model._meta.db_table),
+                    pk=qn(queryset.model._meta.pk.column),
+                ),
+                "{fts} MATCH %s".format(fts=FTS_TABLE),
+            ],
+            params=[match],
+            # bm25 is lower-is-better, flip it so every backend sorts descending
+            select={"search_rank": "-bm25({fts}, 2.0, 1.0)".format(fts=FTS_TABLE)},
+        )
+
+    def index(self, rows):
+        """Index (id, title, description) rows, replacing older entries."""
+        rows = list(rows)
+        if not rows:
+            return
+        self.remove([row[0] for row in rows])
+        self._insert(rows)
+
+    def _insert(self, rows):
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                "INSERT INTO {fts}(rowid, title, description) "
+                "VALUES (%s, %s, %s)".format(fts=FTS_TABLE),
+                rows,
+            )
+
+    def remove(self, product_ids):
+        product_ids = list(product_ids)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                "DELETE FROM {fts} WHERE rowid = %s".format(fts=FTS_TABLE),
+                [[pk] for pk in product_ids],
+            )
+
+    def rebuild(self, products, batch_size=5000):
+        # one transaction, so searches never see a half-empty index
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute("DELETE FROM {fts}".format(fts=FTS_TABLE))
+            batch = []
+            for row in products.values_list("id", "title", "description").iterator(
+                chunk_size=batch_size
+            ):
+                batch.append(row)
+                if len(batch) == batch_size:
+                    self._insert(batch)
+                    batch = []
+            self._insert(batch)
+
+
+class PostgresSearchBackend:
+    """
+    tsvector search backed by a GIN expression index, which Postgres keeps
+    up to date on its own, so index() and remove() have nothing to do.
+    """
+
+    @staticmethod
+    def vector():
+        from django.contrib.postgres.search import SearchVector
+
+        return SearchVector("title", weight="A", config=PG_CONFIG) + SearchVector(
+            "description", weight="B", config=PG_CONFIG
+        )
+
+    def search(self, queryset, terms):
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        query = SearchQuery(" ".join(terms), config=PG_CONFIG, search_type="plain")
+        return queryset.annotate(search_vector=self.vector()).filter(
+            search_vector=query
+        ).annotate(search_rank=SearchRank(self.vector(), query))
+
+    def index(self, rows):
+        pass
+
+    def remove(self, product_ids):
+        pass
+
+    def rebuild(self, products, batch_size=None):
+        with connection.cursor() as cursor:
+            cursor.execute("REINDEX INDEX {}".format(PG_INDEX))
+
+
+BACKENDS = {
+    "sqlite": SQLiteSearchBackend,
+    "postgresql": PostgresSearchBackend,
+}
+
+
+def get_search_backend():
+    """
+    The backend named by STORE_SEARCH_BACKEND, else the one for the database
+    vendor, else None (plain icontains search).
+    """
+    path = getattr(settings, "STORE_SEARCH_BACKEND", None)
+    if path:
+        return import_string(path)()
+    backend = BACKENDS.get(connection.vendor)
+    return backend() if backend else None
+
+
+class ProductSearchFilter(SearchFilter):
+    """
+    ?search= through the full-text backend, ranked best match first unless
+    the client asked for an explicit ?ordering=. Ranked results come in
+    page-number pages only: a cursor can't position on the rank, so asking
+    for one is a 400 rather than results silently re-sorted by id.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        backend = get_search_backend()
+        if not terms or backend is None:
+            return super().filter_queryset(request, queryset, view)
+        queryset = backend.search(queryset, terms)
+        if api_settings.ORDERING_PARAM in request.query_params:
+            return queryset
+        if StorePagination.cursor_requested(request):
+            raise ValidationError(
+                {
+                    StorePagination.mode_query_param: [
+                        "Ranked search results can't be paged by cursor; use "
+                        "page numbers or pass ?{}=.".format(
+                            api_settings.ORDERING_PARAM
+                        )
+                    ]
+                }
+            )
+        return queryset.order_by("-search_rank", "id")
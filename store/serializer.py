@@ -1,5 +1,4 @@
 from rest_framework import serializers
-from decimal import Decimal
 from .models import (
     Product,
     Collection,
@@ -11,6 +10,17 @@ from .models import (
     Order,
 )
 from django.db import transaction
+from rest_framework.exceptions import NotFound
+from . import inventory
+from .cache import bump_catalog, bump_reviews
+from .catalog import adjust_reviews_count
+from .customers import get_customer_ref
+from .carts import CartBusy, CartNotFound, UnknownProduct, get_cart_store
+from .compiled import compiled
+from .pricing import PriceCalculator
+
+CART_BUSY = "The cart is being checked out"
+
 
 class CollectionSerializer(serializers.ModelSerializer):
     class Meta:
@@ -20,6 +30,16 @@ class CollectionSerializer(serializers.ModelSerializer):
     products_count = serializers.IntegerField(read_only=True)
 
 
+class ProductListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        # price the whole page at once: one promotions query, not one per row
+        products = list(data.all() if hasattr(data, "all") else data)
+        self.child.calculator = self.context.get(
+            "price_calculator"
+        ) or PriceCalculator(products, self.child.region)
+        return super().to_representation(products)
+
+
 class ProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
@@ -30,14 +50,40 @@ class ProductSerializer(serializers.ModelSerializer):
             "description",
             "inventory",
             "unit_price",
-            "price_with_tax",
             "collection",
+            "reviews_count",
         ]
+        list_serializer_class = ProductListSerializer
+
+    reviews_count = serializers.IntegerField(read_only=True)
+    calculator = None
+
+    @property
+    def region(self):
+        request = self.context.get("request")
+        return request.query_params.get("region") if request else None
+
+    def to_representation(self, product):
+        data = super().to_representation(product)
+        calculator = (
+            self.calculator
+            or self.context.get("price_calculator")
+            or PriceCalculator([product], self.region)
+        )
+        data.update(calculator.prices(product))
+        return data
 
-    price_with_tax = serializers.SerializerMethodField(method_name="cal")
 
-    def cal(self, product):
-        return product.unit_price * Decimal(1.1)
+def serialize_product_rows(rows, region=None):
+    """ProductSerializer output, prices included, for Product.values() rows."""
+    calculator = PriceCalculator([], region)
+    calculator.load([row["id"] for row in rows])
+    products = compiled(ProductSerializer, rows=True).many(rows)
+    for product, row in zip(products, rows):
+        prices = calculator.prices_for(row["id"], row["unit_price"])
+        # floats, as the JSON encoder would have made of the Decimals
+        product.update((name, float(value)) for name, value in prices.items())
+    return products
 
 
 class ReviewSerializer(serializers.ModelSerializer):
@@ -47,7 +93,16 @@ class ReviewSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         product_id = self.context["product_id"]
-        return Review.objects.create(product_id=product_id, **validated_data)
+        with transaction.atomic():
+            review = Review.objects.create(product_id=product_id, **validated_data)
+            adjust_reviews_count(product_id, 1)
+        bump_reviews(product_id)
+        bump_catalog(
+            Product.objects.filter(pk=product_id).values_list(
+                "collection_id", flat=True
+            )
+        )
+        return review
 
 
 class SimpleProductSerializer(serializers.ModelSerializer):
@@ -71,41 +126,34 @@ class CartItemSerializer(serializers.ModelSerializer):
 class CartSerializer(serializers.ModelSerializer):
     id = serializers.UUIDField(read_only=True)
     items = CartItemSerializer(many=True, read_only=True)
-    total_price = serializers.SerializerMethodField(method_name="get_total_price")
-
-    def get_total_price(self, cart: Cart):
-        return sum(
-            [item.quantity * item.product.unit_price for item in cart.items.all()]
-        )
+    total_price = serializers.DecimalField(
+        source="subtotal", max_digits=12, decimal_places=2, read_only=True
+    )
+    item_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Cart
-        fields = ["id", "items", "total_price"]
+        fields = ["id", "items", "item_count", "total_price"]
 
 
 class AddCartItemSerializer(serializers.ModelSerializer):
     product_id = serializers.IntegerField()
 
-    def validate_product_id(self, value):
-        if not Product.objects.filter(pk=value).exists():
-            raise serializers.ValidationError("No product with this id is found")
-        return value
-
     def save(self, **kwargs):
-        cart_id = self.context["cart_id"]
-        product_id = self.validated_data["product_id"]
-        quantity = self.validated_data["quantity"]
-
         try:
-            cart_item = CartItem.objects.get(cart_id=cart_id, product_id=product_id)
-            cart_item.quantity += quantity
-            cart_item.save()
-            self.instance = cart_item
-        except CartItem.DoesNotExist:
-            self.instance = CartItem.objects.create(
-                cart_id=cart_id, **self.validate_data
+            self.instance = get_cart_store().add(
+                self.context["cart_id"],
+                self.validated_data["product_id"],
+                self.validated_data["quantity"],
             )
-
+        except CartNotFound:
+            raise NotFound("No cart with given id was found")
+        except UnknownProduct:
+            raise serializers.ValidationError(
+                {"product_id": ["No product with this id is found"]}
+            )
+        except CartBusy:
+            raise serializers.ValidationError(CART_BUSY)
         return self.instance
 
     class Meta:
@@ -114,6 +162,17 @@ class AddCartItemSerializer(serializers.ModelSerializer):
 
 
 class UpdateCartItemSerializer(serializers.ModelSerializer):
+    def update(self, instance, validated_data):
+        try:
+            item = get_cart_store().update(
+                instance.cart_id, instance.pk, validated_data["quantity"]
+            )
+        except CartBusy:
+            raise serializers.ValidationError(CART_BUSY)
+        if item is None:
+            raise NotFound("No cart item with given id was found")
+        return item
+
     class Meta:
         model = CartItem
         fields = ["quantity"]
@@ -143,42 +202,136 @@ class OrderSerializer(serializers.ModelSerializer):
         fields = ["id", "placed_at", "customer", "payment_status", "items"]
 
 
+class FlatOrderSerializer:
+    """
+    Read-only OrderSerializer output for a page of Order.values() rows. The
+    items of every order come from one values() query, and orders and items
+    are built by compiled serializers instead of a serializer per row.
+    """
+
+    def __init__(self, orders):
+        self.orders = orders
+
+    @classmethod
+    def order_fields(cls):
+        return compiled(OrderSerializer, rows=True, exclude=("items",)).columns
+
+    @property
+    def data(self):
+        order = compiled(OrderSerializer, rows=True, exclude=("items",))
+        item = compiled(OrderItemSerializer, rows=True)
+        items = {row["id"]: [] for row in self.orders}
+        rows = (
+            OrderItem.objects.filter(order_id__in=items)
+            .order_by("id")
+            .values("order_id", *item.columns)
+        )
+        for row in rows:
+            items[row["order_id"]].append(item(row))
+        data = order.many(self.orders)
+        for output in data:
+            output["items"] = items[output["id"]]
+        return data
+
+
 class CreateOrderSerializer(serializers.Serializer):
     cart_id = serializers.UUIDField()
-    
-    
-    def validate_cart_id(self,cart_id):
-        if not Cart.objects.filter(pk=cart_id).exists():
+
+    def validate_cart_id(self, cart_id):
+        quantities = get_cart_store().quantities(cart_id)
+        if quantities is None:
             raise serializers.ValidationError("No cart with given id was found")
-        if CartItem.objects.filter(cart_id=cart_id).count()==0:
-            raise serializers.ValidationError("No cart is empty")
-            
+        if not quantities:
+            raise serializers.ValidationError("The cart is empty")
         return cart_id
 
     def save(self, **kwargs):
-        
-        print(self.validated_data["cart_id"])
-        print(self.context["user_id"])
-        with transaction.atomic():
-            cart_id=self.validated_data["cart_id"]
-            (customer, created) = Customer.objects.select_related("product").get_or_create(
-                user_id=self.context["user_id"]
+        cart_id = self.validated_data["cart_id"]
+        try:
+            with transaction.atomic(), get_cart_store().checkout(
+                cart_id
+            ) as quantities:
+                return self.place_order(cart_id, quantities)
+        except CartBusy:
+            raise serializers.ValidationError({"cart_id": [CART_BUSY]})
+
+    def place_order(self, cart_id, quantities):
+        if quantities is None:
+            raise serializers.ValidationError(
+                {"cart_id": ["No cart with given id was found"]}
             )
-            order=Order.objects.create(customer=customer)
-
-            cart_items = CartItem.objects.filter(cart_id=self.validated_data["card_id"])
-            order_items= [
+        prices = dict(
+            Product.objects.filter(pk__in=quantities).values_list("pk", "unit_price")
+        )
+        # products deleted since they were added drop out of the order
+        quantities = {
+            product_id: quantity
+            for product_id, quantity in quantities.items()
+            if product_id in prices
+        }
+        if not quantities:
+            raise serializers.ValidationError({"cart_id": ["The cart is empty"]})
+
+        order = Order.objects.create(
+            customer_id=get_customer_ref(self.context["user_id"]).id
+        )
+        OrderItem.objects.bulk_create(
+            [
                 OrderItem(
                     order=order,
-                    product=item.product,
-                    unit_price=item.product.unit_price,
-                    quantity=item.quantity,
+                    product_id=product_id,
+                    unit_price=prices[product_id],
+                    quantity=quantity,
                 )
-                for item in cart_items
+                for product_id, quantity in quantities.items()
             ]
-            
-            OrderItem.objects.bulk_create(order_items)
-            return Cart.objects.filter(pk=cart_id).delete
+        )
+        try:
+            inventory.checkout(cart_id, quantities)
+        except inventory.InsufficientStock:
+            raise serializers.ValidationError(
+                {"cart_id": ["Not enough inventory for some of the products"]}
+            )
+        return order
+
+
+class ReserveCartSerializer(serializers.Serializer):
+    expires_at = serializers.DateTimeField(read_only=True)
+
+    def save(self, **kwargs):
+        cart_id = self.context["cart_id"]
+        quantities = get_cart_store().quantities(cart_id) or {}
+        try:
+            self.instance = {"expires_at": inventory.reserve_cart(cart_id, quantities)}
+        except inventory.InsufficientStock as e:
+            raise serializers.ValidationError(
+                {
+                    "items": [
+                        "Not enough inventory for product {}".format(product_id)
+                        for product_id in e.product_ids
+                    ]
+                }
+            )
+        return self.instance
+
+
+class OrderExportSerializer(serializers.Serializer):
+    output = serializers.ChoiceField(choices=["csv", "ndjson"], default="csv")
+    placed_after = serializers.DateTimeField(required=False)
+    placed_before = serializers.DateTimeField(required=False)
+    payment_status = serializers.ChoiceField(
+        choices=Order.PAYMENT_STATUS_CHOICES, required=False
+    )
+
+    def filter(self, queryset):
+        data = self.validated_data
+        if "placed_after" in data:
+            queryset = queryset.filter(placed_at__gte=data["placed_after"])
+        if "placed_before" in data:
+            queryset = queryset.filter(placed_at__lt=data["placed_before"])
+        if "payment_status" in data:
+            queryset = queryset.filter(payment_status=data["payment_status"])
+        return queryset
 
 
 class UpdateOrderSerializer(serializers.ModelSerializer):
@@ -1,12 +1,216 @@
-from .models import Customer
+from .models import Customer, Product, Collection, Promotion, Cart
+from .cache import bump_catalog, bump_reviews
+from . import customers, inventory
+from .carts import reconcile_cart_totals
+from .catalog import adjust_products_count
+from .search import get_search_backend
+from . import facets
+from django.db import transaction
 from django.dispatch import receiver
-from django.db.models.signals import post_save
+from django.db.models.signals import (
+    post_save,
+    post_delete,
+    post_init,
+    pre_delete,
+    m2m_changed,
+)
 from django.conf import settings
+from core.authentication import revoke_tokens
 
 @receiver(post_save,sender=settings.AUTH_USER_MODEL)
 def create_customer_for_new_user(sender, **kwargs):
     if kwargs["created"]:
         print("signal created")
-        Customer.objects.create(user=kwargs["instance"])
+        customer = Customer.objects.create(user=kwargs["instance"])
+        # warm the customer id cache for the new user's first requests
+        transaction.on_commit(
+            lambda: customers.remember(
+                customer.user_id, customer.pk, customer.membership
+            )
+        )
 
 
+@receiver(post_save, sender=Customer)
+def refresh_cached_customer(sender, instance, created, **kwargs):
+    if not created:
+        transaction.on_commit(
+            lambda: customers.remember(
+                instance.user_id, instance.pk, instance.membership
+            )
+        )
+
+
+@receiver(post_delete, sender=Customer)
+def forget_cached_customer(sender, instance, **kwargs):
+    customers.forget(instance.user_id)
+    # tokens carry the customer id as a claim
+    revoke_tokens(instance.user_id)
+    # and again once committed, in case a request cached it in between
+    transaction.on_commit(lambda: customers.forget(instance.user_id))
+
+
+@receiver(post_init, sender=Product)
+def remember_product_state(sender, instance, **kwargs):
+    # read from __dict__ so deferred loads don't trigger a query per row
+    instance._loaded_collection_id = instance.__dict__.get("collection_id")
+    instance._loaded_unit_price = instance.__dict__.get("unit_price")
+    instance._loaded_inventory = instance.__dict__.get("inventory")
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_cache(sender, instance, **kwargs):
+    bump_catalog([instance.collection_id, instance._loaded_collection_id])
+
+
+@receiver(post_delete, sender=Product)
+def invalidate_product_reviews_cache(sender, instance, **kwargs):
+    bump_reviews(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+def update_product_facets(sender, instance, created, **kwargs):
+    old = (
+        instance._loaded_collection_id,
+        instance._loaded_unit_price,
+        instance._loaded_inventory,
+    )
+    if created:
+        old = None
+    elif None in old:
+        # loaded with deferred fields, so there is nothing reliable to diff
+        return
+    facets.product_changed(
+        old, (instance.collection_id, instance.unit_price, instance.inventory)
+    )
+
+
+@receiver(pre_delete, sender=Product)
+def remove_product_facets(sender, instance, **kwargs):
+    facets.product_changed(
+        (instance.collection_id, instance.unit_price, instance.inventory), None
+    )
+    # the m2m rows go with the product without sending m2m_changed
+    facets.promotions_changed(
+        instance.promotion.values_list("pk", flat=True), -1
+    )
+
+
+@receiver(post_save, sender=Product)
+def count_collection_products(sender, instance, created, **kwargs):
+    old_id = None if created else instance._loaded_collection_id
+    if not created and old_id in (None, instance.collection_id):
+        return
+    with transaction.atomic():
+        if old_id is not None:
+            adjust_products_count(old_id, -1)
+        adjust_products_count(instance.collection_id, 1)
+
+
+@receiver(post_delete, sender=Product)
+def uncount_collection_product(sender, instance, **kwargs):
+    adjust_products_count(instance.collection_id, -1)
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    backend = get_search_backend()
+    if backend is not None:
+        backend.index([(instance.pk, instance.title, instance.description)])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    backend = get_search_backend()
+    if backend is not None:
+        backend.remove([instance.pk])
+
+
+@receiver(post_save, sender=Product)
+def reprice_carts(sender, instance, created, **kwargs):
+    if created or instance._loaded_unit_price is None:
+        return
+    if instance._loaded_unit_price != instance.unit_price:
+        reconcile_cart_totals(Cart.objects.filter(items__product_id=instance.pk))
+
+
+@receiver(pre_delete, sender=Product)
+def remember_product_carts(sender, instance, **kwargs):
+    # the items cascade away before post_delete, so note their carts now
+    instance._cart_ids = list(
+        Cart.objects.filter(items__product_id=instance.pk)
+        .values_list("pk", flat=True)
+        .distinct()
+    )
+
+
+@receiver(post_delete, sender=Product)
+def reprice_carts_without_product(sender, instance, **kwargs):
+    if instance._cart_ids:
+        reconcile_cart_totals(Cart.objects.filter(pk__in=instance._cart_ids))
+
+
+@receiver(post_save, sender=Product)
+def remember_saved_product_state(sender, instance, **kwargs):
+    # registered last so every receiver above still sees the old values
+    remember_product_state(sender, instance)
+
+
+@receiver(m2m_changed, sender=Product.promotion.through)
+def update_promotion_facets(sender, instance, action, pk_set, **kwargs):
+    from_product = isinstance(instance, Product)
+    if action == "post_add":
+        facets.promotions_changed(
+            pk_set if from_product else [instance.pk] * len(pk_set), 1
+        )
+    elif action in ("pre_remove", "pre_clear"):
+        # count the links that really exist, remove() accepts unlinked ids
+        links = sender.objects.filter(
+            **{"product" if from_product else "promotion": instance}
+        )
+        if action == "pre_remove":
+            links = links.filter(
+                **{"promotion__in" if from_product else "product__in": pk_set}
+            )
+        facets.promotions_changed(links.values_list("promotion_id", flat=True), -1)
+
+
+@receiver(m2m_changed, sender=Product.promotion.through)
+def invalidate_product_promotion_cache(sender, instance, action, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if isinstance(instance, Product):
+        bump_catalog([instance.collection_id])
+        return
+    products = Product.objects.all()
+    if action == "pre_clear":
+        products = products.filter(promotion=instance)
+    else:
+        products = products.filter(pk__in=pk_set)
+    bump_catalog(products.values_list("collection_id", flat=True))
+
+
+@receiver(post_save, sender=Collection)
+@receiver(post_delete, sender=Collection)
+def invalidate_collection_cache(sender, instance, **kwargs):
+    bump_catalog([instance.pk])
+
+
+@receiver(post_delete, sender=Promotion)
+def remove_promotion_facet(sender, instance, **kwargs):
+    facets.promotion_deleted(instance.pk)
+
+
+@receiver(post_save, sender=Promotion)
+@receiver(pre_delete, sender=Promotion)
+def invalidate_promotion_cache(sender, instance, **kwargs):
+    bump_catalog(
+        Product.objects.filter(promotion=instance).values_list(
+            "collection_id", flat=True
+        )
+    )
+
+
+@receiver(pre_delete, sender=Cart)
+def release_cart_reservations(sender, instance, **kwargs):
+    inventory.release_cart(instance.pk)
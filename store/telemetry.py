@@ -0,0 +1,79 @@
+import threading
+from bisect import bisect_left
+
+
+# a bucket for zero, then fixed, roughly 19% wide buckets from 0.05 upwards:
+# recording is one bisect and one increment, and percentiles come out within
+# a bucket of the truth
+BUCKETS = [0.0] + [0.05 * 2 ** (i / 4) for i in range(112)]
+METRICS = ["total_ms", "view_ms", "render_ms", "db_ms", "queries", "bytes"]
+
+_lock = threading.Lock()
+_routes = {}
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q):
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                upper = BUCKETS[index] if index < len(BUCKETS) else self.max
+                return min(upper, self.max)
+        return 0.0
+
+    def summary(self):
+        return {
+            "mean": round(self.sum / self.count, 2) if self.count else 0.0,
+            "p50": round(self.percentile(0.50), 2),
+            "p95": round(self.percentile(0.95), 2),
+            "p99": round(self.percentile(0.99), 2),
+            "max": round(self.max, 2),
+        }
+
+
+def record(route, **values):
+    """Add one request's measurements (see METRICS) to the route's histograms."""
+    with _lock:
+        histograms = _routes.get(route)
+        if histograms is None:
+            histograms = _routes[route] = {metric: Histogram() for metric in METRICS}
+        for metric, value in values.items():
+            if value is not None:
+                histograms[metric].add(value)
+
+
+def snapshot():
+    with _lock:
+        return {
+            route: {
+                "requests": histograms["total_ms"].count,
+                **{
+                    metric: histogram.summary()
+                    for metric, histogram in histograms.items()
+                    if histogram.count
+                },
+            }
+            for route, histograms in sorted(_routes.items())
+        }
+
+
+def reset():
+    with _lock:
+        _routes.clear()
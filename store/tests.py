@@ -1,3 +1,704 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from . import inventory, urls
+from .cache import CATALOG_VERSION_KEY, COLLECTION_VERSION_KEY, get_version
+from .carts import HashCartStore, ORMCartStore, _load_cart_store, get_cart_store
+from .catalog import ProductImporter, read_rows
+from .customers import get_customer_ref
+from .views import ProductViewSet
+from .models import (
+    Cart,
+    CartItem,
+    Collection,
+    Customer,
+    Order,
+    OrderItem,
+    Product,
+    Promotion,
+    Review,
+    StockReservation,
+)
 
-# Create your tests here.
+
+# Most queries any GET endpoint may run. The count must also stay the same
+# whatever the amount of data, which is what catches N+1 regressions.
+QUERY_BUDGETS = {
+    "api-root": 0,
+    "products-list": 2,
+    "products-detail": 2,
+    "products-facets": 1,
+    "product-reviews-list": 1,
+    "product-reviews-detail": 1,
+    "collection-list": 1,
+    "collection-detail": 1,
+    "cart-detail": 2,
+    "cart-items-list": 1,
+    "cart-items-detail": 1,
+    "customer-list": 1,
+    "customer-detail": 1,
+    "customer-me": 1,
+    "orders-list": 3,
+    "orders-detail": 3,
+    "orders-export": 2,
+    "telemetry": 0,
+    "async-products-list": 2,
+    "async-products-detail": 2,
+    "async-product-reviews-list": 1,
+    "async-collection-list": 1,
+    "async-collection-detail": 1,
+    "async-cart-detail": 2,
+}
+
+
+def create_products(count, unit_price=Decimal("9.99"), inventory=100):
+    collection = Collection.objects.create(title="Collection")
+    return [
+        Product.objects.create(
+            title="Product {}".format(i),
+            slug="product-{}".format(i),
+            unit_price=unit_price,
+            inventory=inventory,
+            collection=collection,
+        )
+        for i in range(count)
+    ]
+
+
+def shopper_client():
+    user = get_user_model().objects.create(
+        username="shopper", email="shopper@example.com"
+    )
+    # warm the customer cache, as any earlier request of theirs would have
+    get_customer_ref(user.pk)
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+def fill_cart(client, quantities):
+    """A new cart holding {product_id: quantity}, filled through the API."""
+    cart_id = client.post(reverse("cart-list")).json()["id"]
+    for product_id, quantity in quantities.items():
+        response = client.post(
+            reverse("cart-items-list", kwargs={"cart_pk": cart_id}),
+            {"product_id": product_id, "quantity": quantity},
+        )
+        assert response.status_code == 201, response.content
+    return cart_id
+
+
+def get_routes():
+    """Every GET route registered in store.urls, nested routers included."""
+    routes = []
+    for pattern in urls.urlpatterns:
+        if "format" in pattern.pattern.regex.groupindex:
+            continue
+        actions = getattr(pattern.callback, "actions", {"get": None})
+        if "get" in actions:
+            routes.append((pattern.name, list(pattern.pattern.regex.groupindex)))
+    return routes
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Walks every GET endpoint at two dataset sizes and checks the query count
+    against QUERY_BUDGETS. Set STORE_QUERY_REPORT to a path to also get wall
+    time, query count and SQL time per endpoint as JSON.
+    """
+
+    def seed(self, scale):
+        User = get_user_model()
+        collections = [
+            Collection.objects.create(title="Collection {}".format(i))
+            for i in range(scale)
+        ]
+        promotions = [
+            Promotion.objects.create(description="Promo {}".format(i), discount=0.1)
+            for i in range(scale)
+        ]
+        products = []
+        for i in range(scale * 5):
+            product = Product.objects.create(
+                title="Product {}".format(i),
+                slug="product-{}".format(i),
+                description="A product",
+                unit_price=Decimal("9.99") + i,
+                inventory=100,
+                collection=collections[i % scale],
+            )
+            product.promotion.add(promotions[i % scale])
+            Review.objects.create(product=product, name="Reviewer", description="Ok")
+            products.append(product)
+        for i in range(scale):
+            user = User.objects.create(
+                username="shopper{}-{}".format(scale, i),
+                email="shopper{}-{}@example.com".format(scale, i),
+            )
+            order = Order.objects.create(customer=Customer.objects.get(user=user))
+            cart = Cart.objects.create()
+            for product in products[:scale]:
+                OrderItem.objects.create(
+                    order=order,
+                    product=product,
+                    quantity=1,
+                    unit_price=product.unit_price,
+                )
+                CartItem.objects.create(cart=cart, product=product, quantity=2)
+        return products[0], Review.objects.filter(product=products[0]).first()
+
+    def url_kwargs(self, name, product, review):
+        cart = Cart.objects.filter(items__isnull=False).first()
+        pks = {
+            "products": product.pk,
+            "product-reviews": review.pk,
+            "collection": product.collection_id,
+            "cart": cart.pk,
+            "cart-items": cart.items.first().pk,
+            "customer": self.customer.pk,
+            "orders": Order.objects.filter(items__isnull=False).first().pk,
+        }
+        return {
+            "pk": pks.get(name.removeprefix("async-").rsplit("-", 1)[0]),
+            "product_pk": product.pk,
+            "cart_pk": cart.pk,
+        }
+
+    def measure(self, client, url):
+        cache.clear()
+        start = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+            if response.streaming:
+                b"".join(response.streaming_content)
+        elapsed = time.perf_counter() - start
+        self.assertEqual(response.status_code, 200, url)
+        return {
+            "url": url,
+            "queries": len(queries),
+            "sql_ms": round(sum(float(q["time"]) for q in queries) * 1000, 3),
+            "wall_ms": round(elapsed * 1000, 3),
+        }
+
+    def test_query_budgets(self):
+        staff = get_user_model().objects.create(
+            username="staff", email="staff@example.com", is_staff=True
+        )
+        self.customer = Customer.objects.get(user=staff)
+        client = APIClient()
+        client.force_authenticate(staff)
+
+        routes = get_routes()
+        report = {}
+        for scale in (2, 6):
+            (product, review) = self.seed(scale)
+            for name, kwarg_names in routes:
+                kwargs = self.url_kwargs(name, product, review)
+                url = reverse(name, kwargs={k: kwargs[k] for k in kwarg_names})
+                report.setdefault(name, {})[scale] = self.measure(client, url)
+
+        for name, by_scale in report.items():
+            with self.subTest(endpoint=name):
+                self.assertIn(name, QUERY_BUDGETS, "no query budget for this route")
+                self.assertEqual(
+                    by_scale[2]["queries"],
+                    by_scale[6]["queries"],
+                    "query count grows with the data",
+                )
+                self.assertLessEqual(by_scale[6]["queries"], QUERY_BUDGETS[name])
+
+        path = os.environ.get("STORE_QUERY_REPORT")
+        if path:
+            with open(path, "w") as report_file:
+                json.dump(report, report_file, indent=2)
+
+
+class ReviewPaginationTests(TestCase):
+    def test_cursor_pages_past_offset_cutoff_on_one_day(self):
+        collection = Collection.objects.create(title="Collection")
+        product = Product.objects.create(
+            title="Product",
+            slug="product",
+            unit_price=Decimal("9.99"),
+            inventory=10,
+            collection=collection,
+        )
+        # all written today, so they share one date; more than the 1000 rows
+        # CursorPagination would step over by offset within one position
+        Review.objects.bulk_create(
+            Review(product=product, name="Reviewer", description=str(i))
+            for i in range(1150)
+        )
+
+        client = APIClient()
+        url = reverse("product-reviews-list", kwargs={"product_pk": product.pk})
+        url += "?page_size=100"
+        seen = []
+        for _ in range(20):
+            page = client.get(url).json()
+            seen += [review["id"] for review in page["results"]]
+            url = page["next"]
+            if url is None:
+                break
+        self.assertIsNone(url, "paging never ended")
+        self.assertEqual(len(seen), 1150)
+        self.assertEqual(seen, sorted(set(seen), reverse=True))
+
+
+class CartTotalsTests(TestCase):
+    def test_deleting_a_product_reprices_carts_holding_it(self):
+        collection = Collection.objects.create(title="Collection")
+        (kept, deleted) = [
+            Product.objects.create(
+                title="Product {}".format(i),
+                slug="product-{}".format(i),
+                unit_price=price,
+                inventory=10,
+                collection=collection,
+            )
+            for i, price in enumerate((Decimal("2.50"), Decimal("10.00")))
+        ]
+        store = ORMCartStore()
+        cart_id = store.create()
+        store.add(cart_id, kept.pk, 2)
+        store.add(cart_id, deleted.pk, 3)
+        untouched = store.create()
+        store.add(untouched, kept.pk, 1)
+
+        deleted.delete()
+
+        cart = Cart.objects.get(pk=cart_id)
+        self.assertEqual((cart.subtotal, cart.item_count), (Decimal("5.00"), 2))
+        cart = Cart.objects.get(pk=untouched)
+        self.assertEqual((cart.subtotal, cart.item_count), (Decimal("2.50"), 1))
+
+
+class ProductCursorTests(TestCase):
+    def test_cursor_pages_under_every_ordering(self):
+        collection = Collection.objects.create(title="Collection")
+        for i in range(7):
+            Product.objects.create(
+                title="Product {}".format(i),
+                slug="product-{}".format(i),
+                # repeated prices, so ties are broken by id
+                unit_price=Decimal("9.99") + i % 3,
+                inventory=10,
+                collection=collection,
+            )
+        client = APIClient()
+        # what a page-number page shows, and all a cursor page may show
+        fields = set(client.get(reverse("products-list")).json()[0])
+        for field in ProductViewSet.ordering_fields:
+            for ordering in (field, "-" + field):
+                with self.subTest(ordering=ordering):
+                    url = "{}?pagination=cursor&page_size=3&ordering={}".format(
+                        reverse("products-list"), ordering
+                    )
+                    seen = []
+                    while url is not None:
+                        response = client.get(url)
+                        self.assertEqual(response.status_code, 200)
+                        page = response.json()
+                        for product in page["results"]:
+                            self.assertEqual(set(product), fields)
+                            seen.append(product["id"])
+                        url = page["next"]
+                    self.assertCountEqual(
+                        seen, Product.objects.values_list("pk", flat=True)
+                    )
+
+
+class ConcurrentCartTests(TransactionTestCase):
+    THREADS = 8
+    ADDS = 25
+
+    def test_concurrent_adds_to_one_cart_all_count(self):
+        collection = Collection.objects.create(title="Collection")
+        products = [
+            Product.objects.create(
+                title="Product {}".format(i),
+                slug="product-{}".format(i),
+                unit_price=Decimal("1.25") * (i + 1),
+                inventory=10,
+                collection=collection,
+            )
+            for i in range(2)
+        ]
+        store = ORMCartStore()
+        cart_id = store.create()
+        start = threading.Barrier(self.THREADS)
+        errors = []
+
+        def shop(n):
+            try:
+                start.wait()
+                for i in range(self.ADDS):
+                    store.add(cart_id, products[(n + i) % 2].pk, 1)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=shop, args=(n,)) for n in range(self.THREADS)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        adds = self.THREADS * self.ADDS
+        quantities = dict(
+            CartItem.objects.filter(cart_id=cart_id).values_list(
+                "product_id", "quantity"
+            )
+        )
+        self.assertEqual(quantities, {product.pk: adds // 2 for product in products})
+        cart = Cart.objects.get(pk=cart_id)
+        self.assertEqual(cart.item_count, adds)
+        self.assertEqual(
+            cart.subtotal, sum(product.unit_price * adds // 2 for product in products)
+        )
+
+
+class CacheVersionTests(TestCase):
+    def test_versions_move_when_the_write_commits(self):
+        (product,) = create_products(1)
+        keys = [
+            CATALOG_VERSION_KEY,
+            COLLECTION_VERSION_KEY.format(product.collection_id),
+        ]
+        writes = [
+            lambda: Product.objects.get(pk=product.pk).save(),
+            lambda: inventory.take_stock({product.pk: 1}),
+        ]
+        for write in writes:
+            before = [get_version(key) for key in keys]
+            with self.captureOnCommitCallbacks(execute=True):
+                write()
+                self.assertEqual([get_version(key) for key in keys], before)
+            self.assertEqual(
+                [get_version(key) for key in keys], [v + 1 for v in before]
+            )
+
+
+class OrderListTests(TestCase):
+    def test_page_numbers_walk_orders_newest_first(self):
+        user = get_user_model().objects.create(
+            username="staff", email="staff@example.com", is_staff=True
+        )
+        customer = Customer.objects.get(user=user)
+        orders = [Order.objects.create(customer=customer) for _ in range(5)]
+        client = APIClient()
+        client.force_authenticate(user)
+
+        url = reverse("orders-list") + "?page_size=2"
+        seen = []
+        while url is not None:
+            page = client.get(url).json()
+            seen += [order["id"] for order in page["results"]]
+            url = page["next"]
+        self.assertEqual(seen, [order.pk for order in reversed(orders)])
+
+
+class PurgeCartsTests(TestCase):
+    def test_purge_deletes_idle_carts_and_returns_their_stock(self):
+        (product,) = create_products(1, inventory=10)
+        store = ORMCartStore()
+        idle = [store.create() for _ in range(3)]
+        for cart_id in idle:
+            store.add(cart_id, product.pk, 2)
+        inventory.reserve_cart(idle[0], {product.pk: 2})
+        Cart.objects.filter(pk__in=idle).update(
+            updated_at=timezone.now() - timedelta(days=31)
+        )
+        fresh = store.create()
+        store.add(fresh, product.pk, 1)
+
+        batches = list(store.purge(timezone.now() - timedelta(days=30), 2))
+
+        self.assertEqual([batch[:2] for batch in batches], [(2, 2), (1, 1)])
+        self.assertEqual(list(Cart.objects.values_list("pk", flat=True)), [fresh])
+        self.assertFalse(StockReservation.objects.exists())
+        product.refresh_from_db()
+        self.assertEqual(product.inventory, 10)
+
+
+class AsyncListTests(TestCase):
+    def test_product_list_filters_and_orders_like_the_sync_one(self):
+        products = create_products(5)
+        for i, product in enumerate(products):
+            product.unit_price = Decimal("20.00") - i
+            product.title = "Blue teapot" if i == 2 else product.title
+            product.save()
+        queries = [
+            "search=teapot",
+            "ordering=-unit_price",
+            "ordering=unit_price",
+            "collection_id={}".format(products[0].collection_id),
+        ]
+        for query in queries:
+            with self.subTest(query=query):
+                sync = self.client.get(reverse("products-list") + "?" + query)
+                response = self.client.get(
+                    reverse("async-products-list") + "?" + query
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    [product["id"] for product in response.json()["results"]],
+                    [product["id"] for product in sync.json()],
+                )
+
+        response = self.client.get(reverse("async-products-list") + "?collection_id=x")
+        self.assertEqual(response.status_code, 400)
+
+    def test_review_list_is_newest_first(self):
+        (product,) = create_products(1)
+        reviews = [
+            Review.objects.create(product=product, name="Reviewer", description=str(i))
+            for i in range(3)
+        ]
+        kwargs = {"product_pk": product.pk}
+        sync = self.client.get(reverse("product-reviews-list", kwargs=kwargs))
+        response = self.client.get(reverse("async-product-reviews-list", kwargs=kwargs))
+        ids = [review["id"] for review in response.json()["results"]]
+        self.assertEqual(ids, [review.pk for review in reversed(reviews)])
+        self.assertEqual(ids, [review["id"] for review in sync.json()["results"]])
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        self.client = shopper_client()
+
+    def place_order(self, cart_id):
+        return self.client.post(reverse("orders-list"), {"cart_id": cart_id})
+
+    def test_query_count_does_not_grow_with_the_cart(self):
+        products = create_products(8)
+        counts = []
+        for size in (2, 8):
+            cart_id = fill_cart(self.client, {p.pk: 1 for p in products[:size]})
+            with CaptureQueriesContext(connection) as queries:
+                response = self.place_order(cart_id)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()["items"]), size)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_insufficient_stock_places_nothing(self):
+        (plenty, scarce) = create_products(2, inventory=5)
+        Product.objects.filter(pk=scarce.pk).update(inventory=1)
+        cart_id = fill_cart(self.client, {plenty.pk: 2, scarce.pk: 2})
+
+        response = self.place_order(cart_id)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+        self.assertEqual(
+            dict(Product.objects.values_list("pk", "inventory")),
+            {plenty.pk: 5, scarce.pk: 1},
+        )
+        # the cart is left for the shopper to fix
+        self.assertEqual(
+            ORMCartStore().quantities(cart_id), {plenty.pk: 2, scarce.pk: 2}
+        )
+
+
+class ReservationTests(TestCase):
+    def setUp(self):
+        self.client = shopper_client()
+
+    def reserve(self, cart_id):
+        return self.client.post(reverse("cart-reserve", kwargs={"pk": cart_id}))
+
+    def test_reserved_stock_is_held_then_consumed_by_checkout(self):
+        (product,) = create_products(1, inventory=5)
+        cart_id = fill_cart(self.client, {product.pk: 3})
+        self.assertEqual(self.reserve(cart_id).status_code, 201)
+        product.refresh_from_db()
+        self.assertEqual(product.inventory, 2)
+
+        # another cart can't reserve what is held
+        other = fill_cart(self.client, {product.pk: 3})
+        self.assertEqual(self.reserve(other).status_code, 400)
+
+        response = self.client.post(reverse("orders-list"), {"cart_id": cart_id})
+        self.assertEqual(response.status_code, 200)
+        product.refresh_from_db()
+        self.assertEqual(product.inventory, 2)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_release_expired_gives_back_only_expired_stock(self):
+        (product,) = create_products(1, inventory=10)
+        store = ORMCartStore()
+        (stale, live) = (store.create(), store.create())
+        inventory.reserve_cart(stale, {product.pk: 3}, ttl=timedelta(minutes=1))
+        inventory.reserve_cart(live, {product.pk: 4}, ttl=timedelta(hours=1))
+
+        released = inventory.release_expired(
+            batch_size=1, now=timezone.now() + timedelta(minutes=5)
+        )
+
+        self.assertEqual(released, 1)
+        self.assertEqual(
+            list(StockReservation.objects.values_list("cart_id", flat=True)), [live]
+        )
+        product.refresh_from_db()
+        self.assertEqual(product.inventory, 6)
+
+
+class CartBackendTests(TestCase):
+    BACKENDS = [
+        "store.carts.ORMCartStore",
+        "store.carts.CacheCartStore",
+        "store.carts.SQLiteCartStore",
+    ]
+
+    def test_cart_flow_on_every_backend(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.addCleanup(_load_cart_store.cache_clear)
+        client = shopper_client()
+        for backend in self.BACKENDS:
+            _load_cart_store.cache_clear()
+            settings = override_settings(
+                STORE_CART_BACKEND=backend,
+                STORE_CART_DATABASE=os.path.join(directory.name, "carts.sqlite3"),
+            )
+            with self.subTest(backend=backend), settings:
+                self.check_cart_flow(client)
+
+    def check_cart_flow(self, client):
+        (kept, dropped) = create_products(2, unit_price=Decimal("2.50"))
+        cart_id = client.post(reverse("cart-list")).json()["id"]
+        items_url = reverse("cart-items-list", kwargs={"cart_pk": cart_id})
+        cart_url = reverse("cart-detail", kwargs={"pk": cart_id})
+
+        item = client.post(items_url, {"product_id": kept.pk, "quantity": 2}).json()
+        again = client.post(items_url, {"product_id": kept.pk, "quantity": 1})
+        self.assertEqual(again.json(), {**item, "quantity": 3})
+        other = client.post(items_url, {"product_id": dropped.pk, "quantity": 1})
+
+        def item_url(item):
+            return reverse(
+                "cart-items-detail", kwargs={"cart_pk": cart_id, "pk": item["id"]}
+            )
+
+        response = client.patch(item_url(item), {"quantity": 5})
+        self.assertEqual(response.status_code, 200)
+        response = client.delete(item_url(other.json()))
+        self.assertEqual(response.status_code, 204)
+
+        store = get_cart_store()
+        if isinstance(store, HashCartStore):
+            # a cart held by checkout refuses changes checkout would drop
+            store.claim(cart_id)
+            busy = [
+                client.post(items_url, {"product_id": kept.pk, "quantity": 1}),
+                client.patch(item_url(item), {"quantity": 9}),
+                client.delete(item_url(item)),
+            ]
+            store.unclaim(cart_id)
+            self.assertEqual([r.status_code for r in busy], [400, 400, 400])
+
+        # the browsable API renders the item list too
+        response = client.get(items_url, HTTP_ACCEPT="text/html")
+        self.assertEqual(response.status_code, 200)
+
+        cart = client.get(cart_url).json()
+        self.assertEqual(
+            [(i["product"]["id"], i["quantity"]) for i in cart["items"]],
+            [(kept.pk, 5)],
+        )
+        self.assertEqual((cart["item_count"], cart["total_price"]), (5, 12.5))
+
+        # hash stores drop the cart once the order commits
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post(reverse("orders-list"), {"cart_id": cart_id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(i["product"]["id"], i["quantity"]) for i in response.json()["items"]],
+            [(kept.pk, 5)],
+        )
+        self.assertEqual(client.get(cart_url).status_code, 404)
+        kept.refresh_from_db()
+        self.assertEqual(kept.inventory, 95)
+
+
+class ProductImportTests(TestCase):
+    def import_lines(self, *lines):
+        importer = ProductImporter()
+        importer.run(read_rows(io.StringIO("\n".join(lines) + "\n"), "jsonl"))
+        return importer
+
+    def product_line(self, slug, collection="Teapots", unit_price="9.99"):
+        return json.dumps(
+            {
+                "title": slug.title(),
+                "slug": slug,
+                "description": "A product",
+                "unit_price": unit_price,
+                "inventory": 5,
+                "collection": collection,
+            }
+        )
+
+    def test_malformed_lines_are_rejected_not_fatal(self):
+        importer = self.import_lines(
+            self.product_line("first"), "{not json", "[1]", self.product_line("last")
+        )
+        self.assertEqual(importer.created, 2)
+        self.assertEqual(
+            importer.errors, [(2, "not a JSON object"), (3, "not a JSON object")]
+        )
+
+    def test_moving_a_product_invalidates_its_old_collection(self):
+        self.import_lines(self.product_line("kettle", collection="Kettles"))
+        old_key = COLLECTION_VERSION_KEY.format(
+            Collection.objects.get(title="Kettles").pk
+        )
+        before = get_version(old_key)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.import_lines(self.product_line("kettle", collection="Teapots"))
+        self.assertEqual(get_version(old_key), before + 1)
+
+
+class ServerTimingTests(TestCase):
+    def test_header_is_off_unless_asked_for(self):
+        url = reverse("collection-list")
+        self.assertNotIn("Server-Timing", self.client.get(url))
+        # read when the middleware is built, so through a fresh client
+        with override_settings(STORE_SERVER_TIMING=True):
+            self.assertIn("db;dur=", Client().get(url)["Server-Timing"])
+
+
+class SearchPaginationTests(TestCase):
+    def test_ranked_search_pages_by_number_not_cursor(self):
+        products = create_products(3)
+        for product in products:
+            product.title = "Teapot {}".format(product.pk)
+            product.save()
+        url = reverse("products-list") + "?search=teapot&page_size=2"
+        self.assertEqual(self.client.get(url).status_code, 200)
+        response = self.client.get(url + "&pagination=cursor")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("pagination", response.json())
+        # with an explicit order there is nothing for the cursor to lose
+        response = self.client.get(url + "&pagination=cursor&ordering=unit_price")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["results"]), 2)
@@ -1,5 +1,5 @@
 from django.urls import path, include
-from . import views
+from . import views, async_views
 from rest_framework_nested import routers
 from pprint import pprint
 
@@ -18,4 +18,28 @@ product_router.register("reviews", views.ReviewViewSet, basename="product-review
 
 cart_router=routers.NestedDefaultRouter(router,"carts",lookup="cart")
 cart_router.register("items",views.CartItemViewSet,basename="cart-items")
-urlpatterns = router.urls + product_router.urls+cart_router.urls
+urlpatterns = router.urls + product_router.urls+cart_router.urls + [
+    path("telemetry/", views.TelemetryView.as_view(), name="telemetry"),
+    path("async/products/", async_views.product_list, name="async-products-list"),
+    path(
+        "async/products/<int:pk>/",
+        async_views.product_detail,
+        name="async-products-detail",
+    ),
+    path(
+        "async/products/<int:product_pk>/reviews/",
+        async_views.review_list,
+        name="async-product-reviews-list",
+    ),
+    path(
+        "async/collections/",
+        async_views.collection_list,
+        name="async-collection-list",
+    ),
+    path(
+        "async/collections/<int:pk>/",
+        async_views.collection_detail,
+        name="async-collection-detail",
+    ),
+    path("async/carts/<uuid:pk>/", async_views.cart_detail, name="async-cart-detail"),
+]
@@ -1,3 +1,7 @@
+from uuid import UUID
+from django.db import transaction
+from django.db.models import Prefetch
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from rest_framework.response import Response
 from rest_framework.decorators import api_view, action
@@ -13,10 +17,9 @@ from rest_framework.permissions import DjangoModelPermissions
 from .permission import IsAdminOrReadOnly, FullDjangoModelPermission
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
 from rest_framework.filters import SearchFilter, OrderingFilter
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Count
-from rest_framework.pagination import PageNumberPagination
 from .models import Product, Collection, Review
 from .serializer import (
     ProductSerializer,
@@ -28,26 +31,66 @@ from .serializer import (
     UpdateCartItemSerializer,
     CustomerSerializer,
     OrderSerializer,
+    FlatOrderSerializer,
     CreateOrderSerializer,
-    UpdateOrderSerializer
+    UpdateOrderSerializer,
+    ReserveCartSerializer,
+    OrderExportSerializer,
+    CART_BUSY,
+    serialize_product_rows,
 )
 from rest_framework.viewsets import ModelViewSet, GenericViewSet
 from .models import Product, Collection, OrderItem, Cart, CartItem, Customer, Order
-
-
-class ProductViewSet(ModelViewSet):
+from .cache import (
+    REVIEWS_VERSION_KEY,
+    CachedResponseMixin,
+    ConditionalResponseMixin,
+    bump_catalog,
+    bump_reviews,
+)
+from .catalog import adjust_reviews_count
+from .pagination import ReviewPagination, StorePagination
+from .search import ProductSearchFilter
+from . import telemetry
+from .facets import count_facets, read_index
+from .exports import export_orders_response
+from . import inventory
+from .carts import CartBusy, CartContents, get_cart_store
+from .customers import load_customer
+from .compiled import CompiledListMixin, compiled
+
+
+class ProductViewSet(
+    ConditionalResponseMixin, CachedResponseMixin, CompiledListMixin, ModelViewSet
+):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    filter_backends = [DjangoFilterBackend, OrderingFilter, ProductSearchFilter]
     filterset_fields = ["collection_id", "unit_price"]
     search_fields = ["title", "description"]
-    ordering_fields = ["unit_price", "last_update"]
-    pagination_class = PageNumberPagination
+    ordering_fields = ["unit_price", "last_update", "reviews_count"]
+    ordering = ["id"]
+    pagination_class = StorePagination
     permission_classes = [IsAdminOrReadOnly]
 
     def get_serializer_context(self):
         return {"request": self.request}
 
+    def serialize_rows(self, serializer, rows):
+        return serialize_product_rows(rows, self.request.query_params.get("region"))
+
+    @action(detail=False)
+    def facets(self, request):
+        return self.cached_response(self.get_facets, request)
+
+    def get_facets(self, request):
+        # unfiltered counts come from the maintained index, filtered ones
+        # have to be counted (and are cached like any other list)
+        filter_params = [*self.filterset_fields, SearchFilter.search_param]
+        if not any(param in request.query_params for param in filter_params):
+            return Response(read_index())
+        return Response(count_facets(self.filter_queryset(self.get_queryset())))
+
     def destroy(self, request, *args, **kwargs):
         if OrderItem.objects.filter(product_id=kwargs["pk"]).count() > 0:
             return Response(
@@ -59,17 +102,14 @@ class ProductViewSet(ModelViewSet):
         return super().destroy(request, *args, **kwargs)
 
 
-class CollectionViewSet(ModelViewSet):
-    queryset = Collection.objects.annotate(products_count=Count("products"))
+class CollectionViewSet(ConditionalResponseMixin, ModelViewSet):
+    queryset = Collection.objects.all()
     serializer_class = CollectionSerializer
     permission_classes = [IsAdminOrReadOnly]
 
     def destroy(self, request, *args, **kwargs):
-        collection = get_object_or_404(
-            Collection.objects.annotate(products_count=Count("products")),
-            pk=kwargs["pk"],
-        )
-        if collection.products.count() > 0:
+        collection = get_object_or_404(Collection, pk=kwargs["pk"])
+        if collection.products_count > 0:
             return Response(
                 {
                     "error": "Collection can't be deleted because it is assocaited with an other item"
@@ -79,8 +119,9 @@ class CollectionViewSet(ModelViewSet):
         return super().destroy(request, *args, **kwargs)
 
 
-class ReviewViewSet(ModelViewSet):
+class ReviewViewSet(CachedResponseMixin, ModelViewSet):
     serializer_class = ReviewSerializer
+    pagination_class = ReviewPagination
 
     def get_queryset(self):
         return Review.objects.filter(product_id=self.kwargs["product_pk"])
@@ -88,13 +129,77 @@ class ReviewViewSet(ModelViewSet):
     def get_serializer_context(self):
         return {"product_id": self.kwargs["product_pk"]}
 
+    def get_version_key(self):
+        # pages only change when this product's reviews do
+        return REVIEWS_VERSION_KEY.format(self.kwargs["product_pk"])
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        bump_reviews(serializer.instance.product_id)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance.delete()
+            adjust_reviews_count(instance.product_id, -1)
+        bump_reviews(instance.product_id)
+        bump_catalog(
+            Product.objects.filter(pk=instance.product_id).values_list(
+                "collection_id", flat=True
+            )
+        )
+
+
+def parse_cart_id(value):
+    try:
+        return UUID(str(value))
+    except ValueError:
+        raise Http404
+
+
+def parse_item_id(value):
+    try:
+        return int(value)
+    except ValueError:
+        raise Http404
+
 
 class CartViewSet(
     CreateModelMixin, GenericViewSet, RetrieveModelMixin, DestroyModelMixin
 ):
-    queryset = Cart.objects.prefetch_related("items__product").all()
+    # reads and writes go through the configured cart store, not this queryset
+    queryset = Cart.objects.all()
     serializer_class = CartSerializer
 
+    def get_object(self):
+        cart = get_cart_store().get(parse_cart_id(self.kwargs["pk"]))
+        if cart is None:
+            raise Http404
+        return cart
+
+    def retrieve(self, request, *args, **kwargs):
+        return Response(compiled(CartSerializer)(self.get_object()))
+
+    def perform_create(self, serializer):
+        serializer.instance = CartContents(get_cart_store().create(), [])
+
+    def destroy(self, request, *args, **kwargs):
+        if not get_cart_store().delete(parse_cart_id(kwargs["pk"])):
+            raise Http404
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=True, methods=["POST", "DELETE"])
+    def reserve(self, request, pk):
+        cart_id = parse_cart_id(pk)
+        if not get_cart_store().exists(cart_id):
+            raise Http404
+        if request.method == "DELETE":
+            inventory.release_cart(cart_id)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        serializer = ReserveCartSerializer(data={}, context={"cart_id": cart_id})
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
 
 class CartItemViewSet(ModelViewSet):
     http_method_names = ["get", "post", "patch", "delete"]
@@ -108,12 +213,34 @@ class CartItemViewSet(ModelViewSet):
         return CartItemSerializer
 
     def get_serializer_context(self):
-        return {"cart_id": self.kwargs["cart_pk"]}
+        return {"cart_id": parse_cart_id(self.kwargs["cart_pk"])}
 
     def get_queryset(self):
-        return CartItem.objects.filter(cart_id=self.kwargs["cart_pk"]).select_related(
-            "product"
+        # items come from the cart store; the browsable API still asks for this
+        return CartItem.objects.none()
+
+    def list(self, request, *args, **kwargs):
+        items = get_cart_store().items(parse_cart_id(kwargs["cart_pk"]))
+        return Response(self.get_serializer(items, many=True).data)
+
+    def get_object(self):
+        item = get_cart_store().get_item(
+            parse_cart_id(self.kwargs["cart_pk"]), parse_item_id(self.kwargs["pk"])
         )
+        if item is None:
+            raise Http404
+        return item
+
+    def destroy(self, request, *args, **kwargs):
+        try:
+            removed = get_cart_store().remove(
+                parse_cart_id(kwargs["cart_pk"]), parse_item_id(kwargs["pk"])
+            )
+        except CartBusy:
+            raise ValidationError(CART_BUSY)
+        if not removed:
+            raise Http404
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 class CustomerViewSet(ModelViewSet):
@@ -129,19 +256,35 @@ class CustomerViewSet(ModelViewSet):
 
     @action(detail=False, methods=["GET", "PUT"], permission_classes=[IsAuthenticated])
     def me(self, request):
-        print(request.user, "\n\n\n\n")
-        (customer, created) = Customer.objects.get_or_create(user_id=request.user.id)
+        customer = load_customer(request.user.id)
         if request.method == "GET":
             serializer = CustomerSerializer(customer)
             return Response(serializer.data)
         elif request.method == "PUT":
-            serializer = CustomerSerializer(customer)
+            serializer = CustomerSerializer(customer, data=request.data)
             serializer.is_valid(raise_exception=True)
             serializer.save()
             return Response(serializer.data)
 
 
+def order_items():
+    return Prefetch(
+        "items",
+        queryset=OrderItem.objects.select_related("product").only(
+            "id",
+            "order_id",
+            "quantity",
+            "unit_price",
+            "product__id",
+            "product__title",
+            "product__unit_price",
+        ),
+    )
+
+
 class OrderViewSet(ModelViewSet):
+    pagination_class = StorePagination
+    ordering = ["-id"]
 
     def get_permissions(self):
         if self.request.method in ["PUT","PATCH","DELETE"]:
@@ -154,9 +297,19 @@ class OrderViewSet(ModelViewSet):
         )
         serializer.is_valid(raise_exception=True)
         order = serializer.save()
+        order = Order.objects.prefetch_related(order_items()).get(pk=order.pk)
         serializer = OrderSerializer(order)
         return Response(serializer.data)
 
+    @action(detail=False)
+    def export(self, request):
+        serializer = OrderExportSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return export_orders_response(
+            serializer.filter(self.get_queryset()),
+            serializer.validated_data["output"],
+        )
+
     def get_serializer_class(self):
         if self.request.method == "POST":
             return CreateOrderSerializer
@@ -166,10 +319,38 @@ class OrderViewSet(ModelViewSet):
 
 
     def get_queryset(self):
+        # page numbers need a stable order as much as cursors do
+        queryset = Order.objects.prefetch_related(order_items()).order_by(
+            *self.ordering
+        )
         if self.request.user.is_staff:
-            return Order.objects.all()
-        customer_id = Customer.objects.only("id").get(user_id=self.request.user.id)
-        return Order.objects.filter(customer_id=customer_id)
+            return queryset
+        # joined in the same query instead of looking the customer up first
+        return queryset.filter(customer__user_id=self.request.user.id)
+
+    def list(self, request, *args, **kwargs):
+        queryset = (
+            self.get_queryset()
+            .prefetch_related(None)
+            .values(*FlatOrderSerializer.order_fields())
+        )
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(FlatOrderSerializer(list(queryset)).data)
+        return self.get_paginated_response(FlatOrderSerializer(page).data)
+
+
+class TelemetryView(APIView):
+    """p50/p95/p99 per viewset action for this process; DELETE starts over."""
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(telemetry.snapshot())
+
+    def delete(self, request):
+        telemetry.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 # --------------------------------------------------